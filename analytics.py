@@ -0,0 +1,92 @@
+import networkx as nx
+import re
+from collections import Counter
+
+from course_graph import get_ancestor_index
+
+def get_avg_num_prereqs(courses, undergrad=False):
+    """
+    Gets average number of prereqs for given courses, optionally only for undergrad.
+    Input should be same format as clean_scrape().
+    :param courses: list of courses, same as output of clean_scrape()
+    :type courses: list or tuple
+    :param undergrad: whether only undergrad should be considered
+    :type undergrad: true
+    :return: int
+    """
+    assert isinstance(courses, list) or isinstance(courses, tuple)
+    assert isinstance(undergrad, bool)
+    sum = 0
+    count = 0
+    for (course, prereqs) in courses:
+        if undergrad:
+            num = re.findall('\d+', course)[0]
+            if int(num) >= 200:
+                continue
+        if prereqs:
+            sum += len(prereqs)
+            count += 1
+    return sum/count if count else 0
+
+def get_node_metrics(G, ancestors=None):
+    """
+    Gets the in-degree, out-degree, number of ancestors and number of descendants of every node.
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param ancestors: ancestor index from course_graph.get_ancestor_index(), computed if not given
+    :type ancestors: dict or None
+    :return: dict
+    """
+    assert isinstance(G, nx.DiGraph)
+
+    if ancestors is None:
+        ancestors = get_ancestor_index(G)
+
+    # every node is a descendant of each of its ancestors
+    num_descendants = Counter()
+    for anc in ancestors.values():
+        num_descendants.update(anc)
+
+    return {n: dict(in_degree=G.in_degree(n),
+                    out_degree=G.out_degree(n),
+                    num_ancestors=len(ancestors[n]),
+                    num_descendants=num_descendants[n]) for n in G.nodes()}
+
+def find_root(G, child):
+    """
+    Find the root of any given node.
+    :param G: graph to search
+    :type G: networkx.DiGraph
+    :param child: child node to find root
+    :type child: str
+    :return: str
+    """
+    assert isinstance(G, nx.classes.digraph.DiGraph)
+    assert isinstance(child, str)
+
+    parent = list(G.predecessors(child))
+    if len(parent) == 0:
+        return child
+    else:
+        return find_root(G, parent[0])
+
+def get_flexibility(G):
+    """
+    Computes the number of paths between each end node and all root nodes and divides by total number of nodes.
+    :param G: graph to analyze
+    :type G: networkx.DiGraph
+    :return: float
+    """
+    assert isinstance(G, nx.classes.digraph.DiGraph)
+
+    heads = set()
+    for i in G.nodes:
+        r = find_root(G, i)
+        if r != i:
+            heads.add(r)
+    tails = [n for n in G.nodes() if G.out_degree(n) == 0]
+    sum = 0
+    for h in heads:
+        for t in tails:
+            sum += len(list(nx.all_simple_paths(G,h,t)))
+    return sum/G.number_of_nodes()
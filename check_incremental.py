@@ -0,0 +1,178 @@
+'''
+Checks that update_dept_info() gives the same graph and ancestors as a fresh get_dept_info(), over rounds of
+random edits to the catalogue data (prereqs swapped between courses, dropped, or moved within the catalogue).
+Runs on a copy of raw_course_data/ and quarter_data/ in a temporary directory.
+
+Also checks that prune_cycles() removes the same edges from every real department as the original pruning,
+which ran over the cycle basis of the whole graph (see reference_prune()).
+
+Usage: python check_incremental.py [--depts ECE MAE MATH] [--rounds 20] [--seed 0]
+'''
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+def reference_prune(G):
+    '''
+    The original cycle pruning, over the cycle basis of the whole graph. Modifies G in place.
+    (Its OR check compared course numbers to full course codes, so it never matched and is left out.)
+
+    :param: G
+    :type: networkx.DiGraph
+
+    :return: None
+    '''
+    import networkx as nx
+
+    for cycle in nx.cycle_basis(G.to_undirected()):
+        head = None
+        tail = None
+        for i in cycle:
+            others = cycle.copy()
+            others.remove(i)
+            ancestors = nx.algorithms.dag.ancestors(G, i)
+            descendants = nx.algorithms.dag.descendants(G, i)
+            if all(o in ancestors for o in others):
+                head = i
+            elif all(o in descendants for o in others):
+                tail = i
+        if G.has_edge(tail, head):
+            G.remove_edge(tail, head)
+
+def check_reference(dept):
+    '''
+    Returns the edges prune_cycles() and reference_prune() disagree on for a department, as (kept, removed).
+
+    :param: dept
+    :type: str
+
+    :return: set, set
+    '''
+    from course_graph import get_course_data, generate_graph, prune_cycles
+
+    courses, course_desc, indep_courses, course_prereqs = get_course_data(dept)
+    G = generate_graph(indep_courses, course_prereqs)
+    H = G.copy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        prune_cycles(G, courses)
+    reference_prune(H)
+
+    return set(G.edges()) - set(H.edges()), set(H.edges()) - set(G.edges())
+
+def edit_courses(rng, path, num_edits):
+    '''
+    Applies num_edits random edits to a raw course file (see strip_catalogue.get_raw_course_list()).
+
+    :param: rng
+    :type: random.Random
+
+    :param: path
+    :type: str
+
+    :param: num_edits
+    :type: int
+
+    :return: None
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_courses = eval(f.read())
+
+    items = list(raw_courses.items())
+    for i in range(num_edits):
+        op = rng.choice(('swap', 'drop', 'move'))
+        a, b = rng.randrange(len(items)), rng.randrange(len(items))
+        if op == 'swap':
+            items[a], items[b] = (items[a][0], (items[a][1][0], items[b][1][1])), (items[b][0], (items[b][1][0], items[a][1][1]))
+        elif op == 'drop':
+            items[a] = (items[a][0], (items[a][1][0], None))
+        else:
+            items.insert(b, items.pop(a))
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(repr(dict(items)))
+
+def check_dept(rng, dept, rounds, num_edits):
+    '''
+    Edits the department's data for rounds rounds, updating a DeptInfo incrementally after each, and returns
+    the rounds in which it differed from a fresh build.
+
+    :param: rng
+    :type: random.Random
+
+    :param: dept
+    :type: str
+
+    :param: rounds
+    :type: int
+
+    :param: num_edits
+    :type: int
+
+    :return: list
+    '''
+    from course_graph import get_dept_info, update_dept_info
+
+    # prune_cycles() prints every edge it removes
+    with contextlib.redirect_stdout(io.StringIO()):
+        info = get_dept_info(dept, layout=False)
+
+    failed = []
+    for i in range(rounds):
+        edit_courses(rng, './raw_course_data/' + dept + '.txt', num_edits)
+        with contextlib.redirect_stdout(io.StringIO()):
+            info = info.copy()
+            update_dept_info(info)
+            fresh = get_dept_info(dept, layout=False)
+
+        if list(info.G.nodes()) != list(fresh.G.nodes()) or \
+                list(info.G.edges(data='weight')) != list(fresh.G.edges(data='weight')) or \
+                info.ancestors != fresh.ancestors:
+            extra = set(info.G.edges()) - set(fresh.G.edges())
+            missing = set(fresh.G.edges()) - set(info.G.edges())
+            print('{} round {}: {} extra edges, {} missing edges'.format(dept, i, len(extra), len(missing)))
+            failed.append(i)
+
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check incremental department updates against fresh builds.')
+    parser.add_argument('--depts', nargs='+', default=['ECE', 'MAE', 'MATH'], help='departments to check (default: ECE MAE MATH)')
+    parser.add_argument('--rounds', type=int, default=20, help='rounds of edits per department (default: 20)')
+    parser.add_argument('--edits', type=int, default=3, help='edits per round (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, root)
+    rng = random.Random(args.seed)
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('raw_course_data', 'quarter_data'):
+            shutil.copytree(os.path.join(root, name), os.path.join(directory, name))
+        os.chdir(directory)
+
+        # before any edits, every real department is pruned the same way as originally
+        from course_cli import get_all_depts
+        depts = get_all_depts()
+        differ = 0
+        for dept in depts:
+            kept, removed = check_reference(dept)
+            if kept or removed:
+                differ += 1
+                print('{:<6} pruning keeps {} and removes {} edges the original pruning did not'.format(dept, len(kept), len(removed)))
+        ok = not differ
+        print('pruning {} ({} departments)'.format('ok' if not differ else 'FAIL', len(depts)))
+
+        for dept in args.depts:
+            failed = check_dept(rng, dept, args.rounds, args.edits)
+            ok = ok and not failed
+            print('{:<6} {}'.format(dept, 'ok' if not failed else 'FAIL ({} of {} rounds)'.format(len(failed), args.rounds)))
+
+        os.chdir(root)
+
+    sys.exit(0 if ok else 1)
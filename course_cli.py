@@ -0,0 +1,163 @@
+'''
+Headless batch generation of department graphs, exports and plans.
+
+Example: python course_cli.py --depts all --presets all --out out --jobs 16
+'''
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from offerings import term_range
+
+def get_all_depts():
+    '''
+    Returns every department with catalogue data in raw_course_data/.
+
+    :return: list
+    '''
+    if not os.path.isdir('./raw_course_data/'):
+        return []
+    return sorted(name[:-4] for name in os.listdir('./raw_course_data/') if name.endswith('.txt'))
+
+def run_dept(dept, out_dir, quarters, formats, layout):
+    '''
+    Runs the graph pipeline for a department, and writes its exports (and figure, if layout) to out_dir/DEPT/.
+    Returns the seconds spent in each stage.
+
+    :param dept: str
+    :param out_dir: str
+    :param quarters: list or None
+    :param formats: tuple
+    :param layout: bool
+    :return: dict
+    '''
+    from course_graph import get_dept_info
+    from export import export_records, iter_dept_records
+
+    timings = dict()
+    info = get_dept_info(dept, quarters, layout, timings)
+
+    start = time.perf_counter()
+    dept_dir = os.path.join(out_dir, dept)
+    export_records(iter_dept_records(info), dept_dir, ['edges', 'hover', 'metrics', 'depts'], formats)
+    if layout:
+        with open(os.path.join(dept_dir, 'figure.json'), 'w', encoding='utf-8') as f:
+            f.write(info.fig.to_json())
+    timings['export'] = time.perf_counter() - start
+
+    return timings
+
+def run_preset(name, out_dir, formats, plan_args):
+    '''
+    Plans a preset (see strip_catalogue.presets), and writes it to out_dir/plans/NAME.*.
+    Returns the seconds spent in each stage.
+
+    :param name: str
+    :param out_dir: str
+    :param formats: tuple
+    :param plan_args: dict
+    :return: dict
+    '''
+    from export import export_records, iter_plans
+    from strip_catalogue import presets
+
+    start = time.perf_counter()
+    records = list(iter_plans({name: presets[name]}, **plan_args))
+    plan_time = time.perf_counter() - start
+
+    plan_dir = os.path.join(out_dir, 'plans', name)
+    export_records((('plans', record) for record in records), plan_dir, ['plans'], formats)
+    return dict(plan=plan_time, export=time.perf_counter() - start - plan_time)
+
+def run_task(task):
+    '''
+    Runs a (kind, name, args) task in a worker process. Returns (kind, name, timings, error).
+
+    :param task: tuple
+    :return: tuple
+    '''
+    kind, name, args = task
+    start = time.perf_counter()
+    try:
+        timings = run_dept(name, *args) if kind == 'dept' else run_preset(name, *args)
+        error = None
+    except Exception:
+        timings = dict()
+        error = traceback.format_exc()
+    timings['total'] = time.perf_counter() - start
+
+    return kind, name, timings, error
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Generate department graphs, exports and plans in batch.')
+    parser.add_argument('--depts', nargs='*', default=[], help='department codes, or "all" for every department in raw_course_data/')
+    parser.add_argument('--presets', nargs='*', default=[], help='presets to plan (see strip_catalogue.presets), or "all"')
+    parser.add_argument('--out', default='out', help='output directory (default: out)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='number of worker processes (default: one per core)')
+    parser.add_argument('--formats', nargs='+', default=['jsonl'], choices=['jsonl', 'parquet'], help='export formats')
+    parser.add_argument('--quarters', help='range of quarters for the graphs and the plan window, e.g. FA19-SP20 '
+                                           '(default: VIZ_TERM_RANGE for graphs, PLAN_QUARTERS for plans)')
+    parser.add_argument('--layout', action='store_true', help='also compute the layout and write the figure (requires graphviz)')
+    parser.add_argument('--max-num', type=int, default=5, help='max courses per quarter for plans')
+    parser.add_argument('--iterations', type=int, default=20, help='plans to take the shortest of')
+    parser.add_argument('--start-qtr', type=int, default=1, help='index of the starting quarter in the plan window')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from strip_catalogue import presets
+    depts = get_all_depts() if args.depts == ['all'] else args.depts
+    preset_names = sorted(presets) if args.presets == ['all'] else args.presets
+    unknown = [name for name in preset_names if name not in presets]
+    if unknown:
+        print('unknown presets: ' + ', '.join(unknown))
+        return 2
+    if not depts and not preset_names:
+        print('nothing to do, pass --depts and/or --presets')
+        return 2
+
+    quarters = term_range(*args.quarters.split('-')) if args.quarters else None
+    formats = tuple(args.formats)
+    plan_args = dict(max_num=args.max_num, start_qtr=args.start_qtr, num_iterations=args.iterations, quarters=quarters)
+    tasks = [('dept', dept, (args.out, quarters, formats, args.layout)) for dept in depts] + \
+            [('preset', name, (args.out, formats, plan_args)) for name in preset_names]
+
+    # build the offerings store up front, so the workers don't all rebuild it
+    from offerings import get_offerings_index
+    get_offerings_index()
+
+    start = time.perf_counter()
+    results = []
+    failed = 0
+    with ProcessPoolExecutor(max(1, args.jobs)) as executor:
+        for future in as_completed([executor.submit(run_task, task) for task in tasks]):
+            kind, name, timings, error = future.result()
+            results.append(dict(kind=kind, name=name, timings=timings, error=error))
+            if error:
+                failed += 1
+                print('{} {} failed:\n{}'.format(kind, name, error))
+            else:
+                print('{:<6} {:<8} '.format(kind, name) + '  '.join('{} {:.3f}s'.format(k, v) for k, v in timings.items()))
+
+    wall = time.perf_counter() - start
+    stages = dict()
+    for result in results:
+        for stage, seconds in result['timings'].items():
+            stages[stage] = stages.get(stage, 0) + seconds
+    print('{} tasks in {:.3f}s ({} failed); summed stage times: '.format(len(tasks), wall, failed) +
+          '  '.join('{} {:.3f}s'.format(k, v) for k, v in stages.items()))
+
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    with open(os.path.join(args.out, 'timings.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(wall=wall, stages=stages, tasks=results), f, indent=1)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
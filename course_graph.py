@@ -0,0 +1,738 @@
+import copy
+import hashlib
+import json
+import networkx as nx
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from strip_catalogue import get_raw_course_list, get_offerings
+from scrapercleaner import clean_scrape
+from offerings import term_range
+
+# range of quarters a course must be offered in to be displayed (e.g. VIZ_TERM_RANGE=FA20-SP22)
+viz_quarters = term_range(*os.environ.get('VIZ_TERM_RANGE', 'FA19-SP20').split('-'))
+
+# directory of previously computed layouts, keyed by graph topology (LAYOUT_CACHE_DIR= disables the cache)
+layout_cache_dir = os.environ.get('LAYOUT_CACHE_DIR', './layout_cache/')
+
+# graphs with at least this many nodes or edges are drawn with WebGL (see generate_figure())
+webgl_min_nodes = int(os.environ.get('WEBGL_MIN_NODES', '60'))
+webgl_min_edges = int(os.environ.get('WEBGL_MIN_EDGES', '150'))
+
+# (dash, highlighted) style of each merged edge trace in WebGL figures, in trace order
+edge_styles = [('solid', True), ('dot', True), ('solid', False), ('dot', False)]
+
+# graphs with at least this many nodes are shown as a collapsed level-of-detail view (see LodView), in which
+# courses further than lod_depth prereq links from the selected course are grouped by number range
+# (well above webgl_min_nodes, so that real departments are still drawn in full with WebGL)
+lod_min_nodes = int(os.environ.get('LOD_MIN_NODES', '500'))
+lod_depth = int(os.environ.get('LOD_DEPTH', '2'))
+
+# markdown template for course description
+desc_tmpl = """
+### {}: {}
+
+#### Full Prerequisites: {}
+
+#### Description:
+{}
+"""
+
+def generate_graph(nodes, edges):
+    """
+    Generates a networkx directed graph based on lists of nodes and weighted edges (see networkx.DiGraph.add_weighted_edges_from()).
+    :param nodes: nodes in graph
+    :type nodes: list
+    :param prereqs: weighted edges in graph
+    :type prereqs: list
+    :return: networkx.DiGraph
+    """
+    assert isinstance(nodes, list)
+    assert isinstance(edges, list)
+    G = nx.DiGraph()
+    #G.add_nodes_from(nodes)
+    G.add_weighted_edges_from(edges)
+    return G
+
+def generate_layout(G, cache=True):
+    """
+    Assigns a position to each node of a networkx directed graph.
+    Layouts are cached on disk by topology, so graphviz is only loaded when a new layout has to be computed.
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param cache: whether to use the layout cache, which is never evicted (so not for short-lived graphs)
+    :type cache: bool
+    :return: dict
+    """
+    assert isinstance(G, nx.DiGraph)
+    cache = cache and bool(layout_cache_dir)
+
+    # departments without any displayed prereqs have empty graphs
+    if not G:
+        return dict()
+
+    # graphviz output depends on node and edge order, so both are part of the key
+    topology = json.dumps([list(G.nodes()), list(G.edges())])
+    path = os.path.join(layout_cache_dir, hashlib.sha1(topology.encode('utf-8')).hexdigest() + '.json')
+    if cache and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return {n: tuple(xy) for n, xy in json.load(f).items()}
+
+    # use graphviz for layout, since it is better at generating directed graph layouts with 'dot'
+    from networkx.drawing.nx_agraph import graphviz_layout
+    pos = graphviz_layout(G, prog='dot')
+
+    if cache:
+        try:
+            if not os.path.isdir(layout_cache_dir):
+                os.makedirs(layout_cache_dir)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(pos, f)
+        except OSError:
+            print('unable to write layout to cache directory')
+
+    return pos
+
+def use_webgl(G):
+    """
+    Returns whether a graph is big enough to be drawn with WebGL (see webgl_min_nodes and webgl_min_edges).
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :return: bool
+    """
+    return G.number_of_nodes() >= webgl_min_nodes or G.number_of_edges() >= webgl_min_edges
+
+def get_edge_segments(G, pos, edge_on=None):
+    """
+    Merges the edges of a graph into one polyline per style in edge_styles (segments separated by None),
+    for drawing with a single trace each. Dotted edges are the ones with interchangeable prereqs (weight < 1).
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param pos: node positions from generate_layout()
+    :type pos: dict
+    :param edge_on: whether each edge (in G.edges() order) is highlighted, all edges are if not given
+    :type edge_on: list or None
+    :return: list of (list, list)
+    """
+    segments = [([], []) for _ in edge_styles]
+    for i, (u, v, w) in enumerate(G.edges.data('weight')):
+        x, y = segments[edge_styles.index(('dot' if w < 1 else 'solid', edge_on is None or edge_on[i]))]
+        x.extend((pos[u][0], pos[v][0], None))
+        y.extend((pos[u][1], pos[v][1], None))
+
+    return segments
+
+def generate_figure(G, pos=None, webgl=None):
+    """
+    Generates a plotly figure of a networkx directed graph. The nodes are always the last trace.
+    Small graphs draw each edge as a layout shape; big ones draw the edges as one line trace per style
+    (see get_edge_segments()) and the nodes with WebGL, which stays responsive with thousands of edges.
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param pos: node positions from generate_layout(), computed if not given
+    :type pos: dict
+    :param webgl: whether to draw with WebGL, decided by use_webgl() if not given
+    :type webgl: bool or None
+    :return: plotly.graph_objs.Figure
+    """
+    assert isinstance(G, nx.DiGraph)
+    import plotly.graph_objs as go
+
+    if pos is None:
+        pos = generate_layout(G)
+    if webgl is None:
+        webgl = use_webgl(G)
+
+    # extract the edge endpoint coordinates (from graphviz_layout) to use for drawing in dash
+    edges = []
+    for edge in G.edges.data('weight'):
+        x0, y0 = pos[edge[0]]
+        x1, y1 = pos[edge[1]]
+        edges.append((x0,y0,x1,y1, edge[2]))
+
+    # create lines from the previously generated edges
+    # TODO add arrow drawing somehow?
+    shapes = [dict(
+        type='line',
+        x0 = i[0],
+        y0 = i[1],
+        x1 = i[2],
+        y1 = i[3],
+        layer = 'below',
+        line = dict(color='rgb(127,127,127)',width=2,dash='dot' if i[4] < 1 else 'solid')
+        ) for i in edges] if not webgl else []
+
+    # merged edge traces, which don't take part in hover and click events
+    edge_traces = [go.Scattergl(
+        x=x, y=y,
+        mode='lines',
+        hoverinfo='skip',
+        line=dict(color='rgb(127,127,127)' if on else 'rgba(127,127,127,0.5)', width=2, dash=dash)
+        ) for (x, y), (dash, on) in zip(get_edge_segments(G, pos), edge_styles)] if webgl else []
+
+    # extract the node coordinates (an empty graph gives an empty figure)
+    node_x, node_y = zip(*[pos[i] for i in G.nodes()]) if G else ((), ())
+
+    # create nodes for each course
+    node_trace = (go.Scattergl if webgl else go.Scatter)(
+        customdata= list(G.nodes().keys()),
+        x=node_x, y=node_y,
+        mode='markers+text',
+        # NOTE: hoverinfo determines whether a point will show up on a click event (skip = excluded)
+        hoverinfo='none',
+        text = list(G.nodes().keys()),
+        unselected=dict(marker=dict(opacity=0.5)),
+        marker=dict(
+            color='LightSkyBlue',
+            size=40,
+        ))
+
+    # create the figure to display, with click & hover support
+    return go.Figure(data=edge_traces + [node_trace],
+                 layout=go.Layout(
+                    shapes = shapes,
+                    showlegend=False,
+                    clickmode='event+select',
+                    hovermode='closest',
+                    #dragmode='select',
+                    selectdirection='v',
+                    margin=dict(b=0,l=0,r=0,t=0),
+                    xaxis=dict(showgrid=False, zeroline=False, showticklabels=False,fixedrange=True),
+                    yaxis=dict(showgrid=False, zeroline=False, showticklabels=False,fixedrange=True))
+           )
+
+def get_course_data(dept, quarters=None):
+    """
+    Loads and cleans the catalogue data for a department, and splits it into graph edges.
+    Quarters without recorded offerings are projected from past offerings (see offerings.OfferingsIndex.available()).
+    :param dept: department code
+    :type dept: str
+    :param quarters: quarters a course must be offered in (any of) to be displayed, defaults to viz_quarters
+    :type quarters: list
+    :return: list, dict, list, list
+    """
+    assert isinstance(dept, str)
+
+    raw_courses = get_raw_course_list(dept)
+    courses = clean_scrape(raw_courses)
+    # strip leading zero from course code (edge case: MAE 02, etc.)
+    courses = [(i.lstrip("0"), j) for i, j in courses]
+    course_desc = dict()
+    for k, v in raw_courses.items():
+        # split into course code, course title, and number of units (unused)
+        k_split = k.replace("(", ".").split(".")
+        # remove leading zero from course code
+        course_dept_code = k_split[0].split()
+        course_code = course_dept_code[0] + " " + course_dept_code[1].lstrip("0")
+        course_desc[course_code] = [k_split[1].strip(), v[0]]
+
+    quarters = quarters or viz_quarters
+    courses_offered = get_offerings([dept], quarters).available_in(dept, quarters)
+    # remove the department tags and draw each department as a single node
+    # use weighted edges to show interchangeable prereqs
+    indep_courses = []
+    course_prereqs = []
+    for course in courses:
+        k, v = course
+        # remove grad classes and courses not offered this year
+        num = re.findall('\d+', k)[0]
+        if int(num) >= 200 or k not in courses_offered:
+            continue
+        if v:
+            for i in v:
+                # TODO doesn't show other departments yet
+                prereq_group = []
+                for j in i:
+                    if j.startswith(dept):
+                        # check if the course actually exists in catalog and still offered this year
+                        course_code = j.split()[1].lstrip("0")
+                        if j in course_desc and course_code in courses_offered:
+                            prereq_group.append([course_code, k])
+                    # if from another department, just draw as a single node
+                    else:
+                        pass
+                        #course_prereqs.append([j.split()[0], k, 1/weight])
+                for i in prereq_group:
+                    course_prereqs.append(i+[1/len(prereq_group)])
+
+        # if no prereqs, add as independent node
+        else:
+            indep_courses.append(k)
+
+    return courses, course_desc, indep_courses, course_prereqs
+
+def prune_cycles(G, courses, nodes=None):
+    """
+    Breaks up cycles in the graph if they are redundant (ex: class C requires A and B, but B requires A).
+    Modifies G in place, and returns the list of removed edges.
+    Each connected component is pruned on its own, with its cycle basis rooted at its last node (the root
+    networkx picks when the whole graph is pruned at once, so the result is the same), so the result only depends
+    on the component's node and edge order, not on set or hash order (which lets update_dept_info() re-prune
+    single components).
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param courses: list of courses, same as output of clean_scrape()
+    :type courses: list
+    :param nodes: only consider cycles among these nodes (must be a union of connected components)
+    :type nodes: set or None
+    :return: list
+    """
+    assert isinstance(G, nx.DiGraph)
+
+    removed = []
+    # split the nodes into components, each in graph order, and the components in order of their first node
+    order = [n for n in G.nodes() if nodes is None or n in nodes]
+    component_of = dict()
+    for i, component in enumerate(nx.weakly_connected_components(G.subgraph(order))):
+        component_of.update(dict.fromkeys(component, i))
+    components = dict()
+    for n in order:
+        components.setdefault(component_of[n], []).append(n)
+
+    cycles = []
+    for component in components.values():
+        U = nx.Graph()
+        U.add_nodes_from(component)
+        U.add_edges_from(G.edges(component))
+        cycles.extend(nx.cycle_basis(U, component[-1]))
+
+    for cycle in cycles:
+        # check if there is a distinct head and tail for a cycle, and head is connected directly to tail
+        head = None
+        tail = None
+        false_pos = False
+        for i in cycle:
+            others = cycle.copy()
+            others.remove(i)
+            ancestors = nx.algorithms.dag.ancestors(G, i)
+            descendants = nx.algorithms.dag.descendants(G, i)
+            if all(o in ancestors for o in others):
+                head = i
+            elif all(o in descendants for o in others):
+                tail = i
+        if G.has_edge(tail, head):
+            # find the other predecessor of head for the cycle
+            other_adj = [adj for adj in cycle if adj in G.predecessors(head) and adj != tail]
+            if len(other_adj):
+                # check if it's an OR or an AND (don't remove if it's an OR)
+                for (k, v) in courses:
+                    if k == head:
+                       for reqs in v:
+                           if other_adj[0] in reqs and tail in reqs:
+                               false_pos = True
+                               break
+                       break
+
+            if not false_pos:
+                print("removing edge from {} to {}".format(tail,head))
+                G.remove_edge(tail,head)
+                removed.append((tail, head))
+
+    return removed
+
+def get_ancestor_index(G, nodes=None, index=None):
+    """
+    Computes the full set of prereqs (ancestors) of each node, reusing the ancestors of predecessors.
+    If nodes is given, only those entries of index are recomputed (all others must still be valid).
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param nodes: nodes to recompute, defaults to all nodes
+    :type nodes: set or None
+    :param index: existing ancestor index to update in place
+    :type index: dict or None
+    :return: dict
+    """
+    assert isinstance(G, nx.DiGraph)
+
+    index = dict() if index is None else index
+    nodes = set(G.nodes()) if nodes is None else nodes & set(G.nodes())
+    if not nx.is_directed_acyclic_graph(G):
+        for n in nodes:
+            index[n] = frozenset(nx.algorithms.dag.ancestors(G, n))
+        return index
+
+    # in topological order, the ancestors of every predecessor are already up to date
+    for n in nx.topological_sort(G):
+        if n in nodes:
+            anc = set()
+            for p in G.predecessors(n):
+                anc.add(p)
+                anc.update(index[p])
+            index[n] = frozenset(anc)
+
+    return index
+
+class DeptInfo:
+    """
+    Processed graph of a department, along with the indices used to answer click/hover events.
+    """
+    def __init__(self, dept, quarters, courses, course_desc, edges, G, pos, fig):
+        self.dept = dept
+        self.quarters = quarters
+        self.courses = courses          # output of clean_scrape(), with leading zeros stripped
+        self.course_desc = course_desc  # 'DEPT NUM' -> [title, description]
+        self.edges = edges              # weighted edges before cycle pruning
+        self.G = G
+        self.pos = pos
+        self.fig = fig
+        self.ancestors = get_ancestor_index(G)
+        self.hover_cache = dict()       # node -> result of get_hover_info()
+        self.lod_cache = OrderedDict()  # (selected, expanded) -> LodView, least recently used first
+        self.lod_lock = threading.Lock()  # guards lod_cache, which concurrent callbacks share
+        self.generation = 0             # incremented every time the data is reloaded
+
+    def copy(self):
+        """
+        Returns a copy that can be passed to update_dept_info() without affecting this one.
+        The figure is shared until the update regenerates it.
+        :return: DeptInfo
+        """
+        info = copy.copy(self)
+        info.G = self.G.copy()
+        info.ancestors = dict(self.ancestors)
+        info.hover_cache = dict(self.hover_cache)
+        info.lod_cache = OrderedDict()
+        info.lod_lock = threading.Lock()
+        return info
+
+    def get_desc(self, point):
+        """
+        Returns the markdown description of a course: its title, immediate prereqs and catalogue description.
+        :param point: course number
+        :type point: str
+        :return: str
+        """
+        desc_list = self.course_desc[self.dept + " " + str(point)]
+        immediate_prereqs = next(c for c in self.courses if c[0] == point)[1]
+        if not immediate_prereqs:
+            prereqs_str = 'None'
+        else:
+            prereqs_str = ', '.join(" or ".join(i) for i in immediate_prereqs)
+        return desc_tmpl.format(self.dept + " " + str(point), desc_list[0], prereqs_str, desc_list[1])
+
+    def get_hover_info(self, point):
+        """
+        Returns the description of a course, the indices of the nodes to select, and whether each edge
+        is on the prerequisite tree of the course. Results are cached until the department changes.
+        :param point: course number, or None if nothing is selected
+        :type point: str or None
+        :return: str, list, list
+        """
+        if point in self.hover_cache:
+            return self.hover_cache[point]
+
+        desc = ""
+        prereqs = set()
+
+        # obtain full prereqs from graph, and fill the description template
+        if point:
+            desc = self.get_desc(point)
+            prereqs = set(self.ancestors[point])
+
+        # obtain node indices for dash to select
+        prereqs.add(point)
+        prereq_index = [i for i, e in enumerate(self.G.nodes()) if e in prereqs]
+
+        # highlight all of the nodes if none are selected
+        if not prereq_index:
+            prereq_index = list(range(len(self.G.nodes())))
+
+        # edges which are on the prerequisite tree for selected course
+        edge_on = [j in prereqs and k in prereqs for j, k in self.G.edges()]
+
+        self.hover_cache[point] = (desc, prereq_index, edge_on)
+        return self.hover_cache[point]
+
+    def get_lod_view(self, selected=None, expanded=(), depth=None):
+        """
+        Returns the collapsed view of the graph around a selected course (see LodView), reusing recent views.
+        :param selected: course number the view is centered on, or None
+        :type selected: str or None
+        :param expanded: ids of aggregate nodes to show the courses of
+        :type expanded: iterable
+        :param depth: number of prereq links from the selected course to show, defaults to lod_depth
+        :type depth: int or None
+        :return: LodView
+        """
+        key = (selected, tuple(sorted(expanded)), depth)
+        with self.lod_lock:
+            view = self.lod_cache.get(key)
+            if view is not None:
+                self.lod_cache.move_to_end(key)
+                return view
+
+        # build the view outside the lock, so other views can be served meanwhile
+        view = LodView(self, selected, expanded, depth)
+        with self.lod_lock:
+            self.lod_cache[key] = view
+            while len(self.lod_cache) > 32:
+                self.lod_cache.popitem(last=False)
+        return view
+
+def use_lod(G):
+    """
+    Returns whether a graph is big enough to be shown as a level-of-detail view (see lod_min_nodes).
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :return: bool
+    """
+    return G.number_of_nodes() >= lod_min_nodes
+
+def get_lod_groups(G, selected=None, expanded=(), depth=None):
+    """
+    Assigns the courses to hide to aggregate nodes. Course families (e.g. 20A-20E, courses sharing a number) are
+    collapsed into one node, and if a course is selected, courses further than depth prereq links from it are
+    collapsed into one node per range of ten course numbers. Since aggregates are per course number, the view
+    never has more than a few hundred nodes, however many courses a department has.
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param selected: course number the view is centered on, or None
+    :type selected: str or None
+    :param expanded: ids of aggregate nodes not to collapse
+    :type expanded: iterable
+    :param depth: number of prereq links from the selected course to show, defaults to lod_depth
+    :type depth: int or None
+    :return: dict of node -> aggregate id
+    """
+    assert isinstance(G, nx.DiGraph)
+
+    expanded = set(expanded)
+    depth = lod_depth if depth is None else depth
+
+    families = dict()
+    for n in G.nodes():
+        match = re.fullmatch('(\\d+)[A-Z]+', n)
+        if match:
+            families.setdefault(match.group(1), []).append(n)
+
+    near = nx.single_source_shortest_path_length(G.to_undirected(as_view=True), selected, cutoff=depth) if selected in G else None
+
+    groups = dict()
+    for members in families.values():
+        if len(members) > 1:
+            members.sort(key=lambda n: (len(n), n))
+            family = '{}–{}'.format(members[0], members[-1])
+            # families with a course near the selected one are kept together, rather than split across ranges
+            if family not in expanded:
+                groups.update((n, family) for n in members)
+            if near is not None and any(n in near for n in members):
+                near.update((n, depth) for n in members)
+
+    if near is not None:
+        for n in G.nodes():
+            if n not in near:
+                tens = int(re.match('\\d+', n).group()) // 10 * 10
+                band = 'Courses {}–{}'.format(tens, tens + 9)
+                if band not in expanded:
+                    groups[n] = band
+        # the selected course is always shown on its own
+        groups.pop(selected, None)
+
+    return groups
+
+def collapse_graph(G, groups):
+    """
+    Merges each group of nodes into a single node. Edges between merged nodes are merged too, and are drawn solid
+    if any of them is solid. Returns the collapsed graph, and the members of each aggregate node.
+    :param G: directed graph
+    :type G: networkx.DiGraph
+    :param groups: node -> aggregate id, from get_lod_groups()
+    :type groups: dict
+    :return: networkx.DiGraph, dict
+    """
+    assert isinstance(G, nx.DiGraph)
+
+    H = nx.DiGraph()
+    members = dict()
+    for n in G.nodes():
+        H.add_node(groups.get(n, n))
+        if n in groups:
+            members.setdefault(groups[n], []).append(n)
+    for u, v, w in G.edges.data('weight'):
+        u, v = groups.get(u, u), groups.get(v, v)
+        if u != v:
+            H.add_edge(u, v, weight=max(w, H[u][v]['weight']) if H.has_edge(u, v) else w)
+
+    return H, members
+
+class LodView:
+    """
+    Collapsed view of a department graph (see get_lod_groups()), with the same G, pos, fig and
+    get_hover_info() as DeptInfo so it can be highlighted the same way. Aggregate nodes are drawn in a different color.
+    """
+    def __init__(self, info, selected=None, expanded=(), depth=None):
+        self.info = info
+        self.selected = selected
+        self.groups = get_lod_groups(info.G, selected, expanded, depth)
+        self.G, self.members = collapse_graph(info.G, self.groups)
+        # every selection gives a different graph, so its layout isn't cached on disk (the view is cached by get_lod_view())
+        self.pos = generate_layout(self.G, cache=False)
+        self.fig = generate_figure(self.G, self.pos)
+        self.fig['data'][-1]['marker']['color'] = ['LightSalmon' if n in self.members else 'LightSkyBlue' for n in self.G.nodes()]
+        self.hover_cache = dict()
+
+    def get_hover_info(self, point):
+        """
+        Returns the description of a course or aggregate node, the indices of the nodes to select (the nodes
+        containing any of its prereqs), and whether each edge is on its prerequisite tree.
+        :param point: node of the view, or None if nothing is selected
+        :type point: str or None
+        :return: str, list, list
+        """
+        if point in self.hover_cache:
+            return self.hover_cache[point]
+
+        desc = ""
+        prereqs = set()
+        if point in self.members:
+            courses = sorted(self.members[point], key=lambda n: (len(n), n))
+            desc = "### {}: {} courses (click to expand)\n\n{}".format(point, len(courses), ', '.join(courses))
+            for n in courses:
+                prereqs.update(self.groups.get(a, a) for a in self.info.ancestors[n])
+        elif point:
+            desc = self.info.get_desc(point)
+            prereqs.update(self.groups.get(a, a) for a in self.info.ancestors[point])
+
+        prereqs.add(point)
+        prereq_index = [i for i, e in enumerate(self.G.nodes()) if e in prereqs]
+        if not prereq_index:
+            prereq_index = list(range(len(self.G.nodes())))
+        edge_on = [j in prereqs and k in prereqs for j, k in self.G.edges()]
+
+        self.hover_cache[point] = (desc, prereq_index, edge_on)
+        return self.hover_cache[point]
+
+def get_dept_info(dept, quarters=None, layout=True, timings=None, lod=False):
+    """
+    Gets the full course info for a specific department.
+    :param dept: department code
+    :type dept: str
+    :param quarters: quarters a course must be offered in (any of) to be displayed, defaults to viz_quarters
+    :type quarters: list
+    :param layout: whether to compute the layout and figure (pos and fig are None otherwise)
+    :type layout: bool
+    :param timings: if given, the seconds spent in each stage (data, graph, prune, layout, figure, ancestors) are added to it
+    :type timings: dict or None
+    :param lod: skip the layout and figure of graphs that use_lod(), which are shown through DeptInfo.get_lod_view()
+    :type lod: bool
+    :return: DeptInfo
+    """
+    timings = dict() if timings is None else timings
+    start = [time.perf_counter()]
+
+    def lap(stage):
+        now = time.perf_counter()
+        timings[stage] = timings.get(stage, 0) + now - start[0]
+        start[0] = now
+
+    quarters = quarters or viz_quarters
+    courses, course_desc, indep_courses, course_prereqs = get_course_data(dept, quarters)
+    lap('data')
+
+    G = generate_graph(indep_courses, course_prereqs)
+    lap('graph')
+    prune_cycles(G, courses)
+    lap('prune')
+
+    #print(nx.algorithms.dag.dag_longest_path(G))
+    #G.remove_nodes_from(list(nx.isolates(G)))
+    layout = layout and not (lod and use_lod(G))
+    pos = generate_layout(G) if layout else None
+    lap('layout')
+    fig = generate_figure(G, pos) if layout else None
+    lap('figure')
+    info = DeptInfo(dept, quarters, courses, course_desc, course_prereqs, G, pos, fig)
+    lap('ancestors')
+    return info
+
+def update_dept_info(info, quarters=None):
+    """
+    Reloads the data for a department and patches the graph, ancestor index and hover cache in place,
+    recomputing only the connected components touched by the changes. The graph is the same as a fresh
+    get_dept_info() would build (see check_incremental.py). The layout and figure are only
+    regenerated if the graph topology (or an edge style) changed.
+    Returns the set of changed course numbers (empty if nothing changed).
+    :param info: department info from get_dept_info()
+    :type info: DeptInfo
+    :param quarters: quarters a course must be offered in (any of) to be displayed, defaults to info.quarters
+    :type quarters: list
+    :return: set
+    """
+    assert isinstance(info, DeptInfo)
+
+    quarters = quarters or info.quarters
+    courses, course_desc, indep_courses, course_prereqs = get_course_data(info.dept, quarters)
+
+    # diff the edges before cycle pruning, and the course data used in descriptions
+    old_edges = {(u, v): w for u, v, w in info.edges}
+    new_edges = {(u, v): w for u, v, w in course_prereqs}
+    added = [(u, v, w) for (u, v), w in new_edges.items() if old_edges.get((u, v)) != w]
+    removed = [e for e in old_edges if e not in new_edges]
+    changed_nodes = {n for e in added for n in e[:2]} | {n for e in removed for n in e}
+
+    old_courses = dict(info.courses)
+    new_courses = dict(courses)
+    changed_groups = {k for k in old_courses.keys() | new_courses.keys() if old_courses.get(k) != new_courses.get(k)}
+    changed_courses = changed_groups | {k.split(" ", 1)[1] for k in info.course_desc.keys() | course_desc.keys()
+                                        if info.course_desc.get(k) != course_desc.get(k)}
+
+    # a component has to be pruned again if any of its edges or prereq groups changed (pruning keeps OR groups),
+    # or if its edges are in a different order (pruning depends on the order, see prune_cycles())
+    raw = generate_graph(indep_courses, course_prereqs)
+    component_of = dict()
+    for i, component in enumerate(nx.weakly_connected_components(raw)):
+        component_of.update(dict.fromkeys(component, i))
+    old_order = dict()
+    new_order = dict()
+    for order, edges in ((old_order, info.edges), (new_order, course_prereqs)):
+        for u, v, w in edges:
+            if u in component_of:
+                order.setdefault(component_of[u], []).append((u, v, w))
+    stale_components = {component_of[n] for n in (changed_nodes | changed_groups) & component_of.keys()}
+    stale_components.update(i for i in new_order if old_order.get(i) != new_order[i])
+    affected = {n for n, i in component_of.items() if i in stale_components}
+    same_edges = course_prereqs == info.edges
+
+    info.quarters = quarters
+    info.courses = courses
+    info.course_desc = course_desc
+    info.edges = course_prereqs
+    if changed_courses or changed_nodes:
+        info.lod_cache.clear()
+    if not affected and same_edges:
+        for n in changed_courses:
+            info.hover_cache.pop(n, None)
+        return changed_courses
+
+    # rebuild the graph from the edges in source order, the same way get_dept_info() does, keep the edges pruned
+    # from the untouched components, and prune the affected components again
+    old_G = info.G
+    old_topology = (list(old_G.nodes()), list(old_G.edges()))
+    pruned = [e for e in old_edges if not old_G.has_edge(*e)]
+    G = raw
+    G.remove_edges_from(e for e in pruned if e[0] not in affected)
+    prune_cycles(G, courses, affected)
+    info.G = G
+
+    # recompute ancestors for the affected components (the courses downstream of a change, before or after it,
+    # are all in them)
+    stale = affected
+    for n in [n for n in info.ancestors if n not in G]:
+        del info.ancestors[n]
+    get_ancestor_index(G, stale, info.ancestors)
+
+    # node and edge indices are positional, so any topology change invalidates every cached hover result
+    if (list(G.nodes()), list(G.edges())) != old_topology:
+        info.hover_cache.clear()
+        if info.pos is not None:
+            info.pos = generate_layout(G)
+    else:
+        for n in stale | changed_courses:
+            info.hover_cache.pop(n, None)
+    if info.pos is not None:
+        info.fig = generate_figure(G, info.pos)
+
+    return changed_courses | changed_nodes
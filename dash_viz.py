@@ -1,92 +1,13 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
-import networkx as nx
-from networkx.drawing.nx_agraph import graphviz_layout
-import plotly.graph_objs as go
-import re
+from dash.dependencies import Input, Output, State
+import os
 
-from strip_catalogue import get_raw_course_list, get_quarter_offerings
-from scrapercleaner import clean_scrape
-
-def generate_graph(nodes, edges):
-    """
-    Generates a networkx directed graph based on lists of nodes and weighted edges (see networkx.DiGraph.add_weighted_edges_from()).
-    :param nodes: nodes in graph
-    :type nodes: list
-    :param prereqs: weighted edges in graph
-    :type prereqs: list
-    :return: networkx.DiGraph
-    """
-    assert isinstance(nodes, list)
-    assert isinstance(edges, list)
-    G = nx.DiGraph()
-    #G.add_nodes_from(nodes)
-    G.add_weighted_edges_from(edges)
-    return G
-
-def generate_figure(G):
-    """
-    Generates a plotly figure of a networkx directed graph.
-    :param G: directed graph
-    :type G: networkx.DiGraph
-    :return: plotly.graph_objs.Figure
-    """
-    assert isinstance(G, nx.DiGraph)
-
-    # use graphviz for layout, since it is better at generating directed graph layouts with 'dot'
-    pos = graphviz_layout(G, prog='dot')
-
-    # extract the edge endpoint coordinates (from graphviz_layout) to use for drawing in dash
-    edges = []
-    for edge in G.edges.data('weight'):
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edges.append((x0,y0,x1,y1, edge[2]))
-
-    # create lines from the previously generated edges
-    # TODO add arrow drawing somehow?
-    shapes = [dict(
-        type='line',
-        x0 = i[0],
-        y0 = i[1],
-        x1 = i[2],
-        y1 = i[3],
-        layer = 'below',
-        line = dict(color='rgb(127,127,127)',width=2,dash='dot' if i[4] < 1 else 'solid')
-        ) for i in edges]
-
-    # extract the node coordinates
-    node_x, node_y = zip(*[pos[i] for i in G.nodes()])
-
-    # create nodes for each course
-    node_trace = go.Scatter(
-        customdata= list(G.nodes().keys()),
-        x=node_x, y=node_y,
-        mode='markers+text',
-        # NOTE: hoverinfo determines whether a point will show up on a click event (skip = excluded)
-        hoverinfo='none',
-        text = list(G.nodes().keys()),
-        unselected=dict(marker=dict(opacity=0.5)),
-        marker=dict(
-            color='LightSkyBlue',
-            size=40,
-        ))
-
-    # create the figure to display, with click & hover support
-    return go.Figure(data=node_trace,
-                 layout=go.Layout(
-                    shapes = shapes,
-                    showlegend=False,
-                    clickmode='event+select',
-                    hovermode='closest',
-                    #dragmode='select',
-                    selectdirection='v',
-                    margin=dict(b=0,l=0,r=0,t=0),
-                    xaxis=dict(showgrid=False, zeroline=False, showticklabels=False,fixedrange=True),
-                    yaxis=dict(showgrid=False, zeroline=False, showticklabels=False,fixedrange=True))
-           )
+from course_graph import get_dept_info, update_dept_info, get_edge_segments
+from data_watcher import DataWatcher
+from offerings import reload_offerings_index
+from plan_service import PlanService, register_plan_routes
 
 # predefined departments to display
 depts = ['ECE', 'CSE', 'MAE', 'BENG', 'NANO', 'SE', 'MATH', 'PHYS']
@@ -96,10 +17,17 @@ external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 server = app.server
 
+# planning endpoint (/api/plan), computed on a separate pool of PLAN_WORKERS processes
+plan_service = PlanService(max_size=int(os.environ.get('PLAN_CACHE_SIZE', '256')),
+                           workers=int(os.environ.get('PLAN_WORKERS', '0')) or None)
+register_plan_routes(server, plan_service)
+
 # page layout: title, graph, options, description
 app.layout = html.Div([
         html.H1('Loading...', id='title'),
         dcc.Graph(id='graph',config={'displayModeBar': False}),
+        # selected course and expanded aggregate nodes of the level-of-detail view of big departments
+        dcc.Store(id='lod-state'),
         html.Div(className='row', children = [
             html.Div([
                 dcc.Markdown('### Choose a department: '),
@@ -109,133 +37,103 @@ app.layout = html.Div([
         ])
 ])
 
-# markdown template for course description
-desc_tmpl = """
-### {}: {}
-
-#### Full Prerequisites: {}
+# preload the data for specific departments, so they don't need to be fetched every time
+# (PRELOAD_DEPTS=0 starts faster and loads each department on first use instead)
+dept_cache = dict()
 
-#### Description:
-{}
-"""
+# plan workers are spawned, and re-import this module as __mp_main__ when it is run directly; they need neither
+# the departments nor the watcher
+plan_worker = __name__ == '__mp_main__'
 
-def get_dept_info(dept):
+def get_cached_dept(dept):
     """
-    Gets the full course info for a specific department.
+    Returns the cached info of a department, loading it if it hasn't been yet.
     :param dept: department code
     :type dept: str
-    :return: networkx.DiGraph, list, list, list
+    :return: course_graph.DeptInfo
     """
-    raw_courses = get_raw_course_list(dept)
-    courses = clean_scrape(raw_courses)
-    # strip leading zero from course code (edge case: MAE 02, etc.)
-    courses = [(i.lstrip("0"), j) for i, j in courses]
-    course_desc = dict()
-    for k, v in raw_courses.items():
-        # split into course code, course title, and number of units (unused)
-        k_split = k.replace("(", ".").split(".")
-        # remove leading zero from course code
-        course_dept_code = k_split[0].split()
-        course_code = course_dept_code[0] + " " + course_dept_code[1].lstrip("0")
-        course_desc[course_code] = [k_split[1].strip(), v[0]]
+    if dept not in dept_cache:
+        print("caching {}".format(dept))
+        dept_cache[dept] = get_dept_info(dept, lod=True)
+    return dept_cache[dept]
 
-    courses_offered = get_quarter_offerings(dept, "FA19") + get_quarter_offerings(dept, "WI20") + get_quarter_offerings(dept, "SP20")
-    # remove the department tags and draw each department as a single node
-    # use weighted edges to show interchangeable prereqs
-    indep_courses = []
-    course_prereqs = []
-    for course in courses:
-        k, v = course
-        # remove grad classes and courses not offered this year
-        num = re.findall('\d+', k)[0]
-        if int(num) >= 200 or k not in courses_offered:
-            continue
-        if v:
-            for i in v:
-                # TODO doesn't show other departments yet
-                prereq_group = []
-                for j in i:
-                    if j.startswith(dept):
-                        # check if the course actually exists in catalog and still offered this year
-                        course_code = j.split()[1].lstrip("0")
-                        if j in course_desc and course_code in courses_offered:
-                            prereq_group.append([course_code, k])
-                    # if from another department, just draw as a single node
-                    else:
-                        pass
-                        #course_prereqs.append([j.split()[0], k, 1/weight])
-                for i in prereq_group:
-                    course_prereqs.append(i+[1/len(prereq_group)])
+if os.environ.get('PRELOAD_DEPTS', '1') != '0' and not plan_worker:
+    for i in depts:
+        get_cached_dept(i)
 
-        # if no prereqs, add as independent node
-        else:
-            indep_courses.append(k)
-
-    G = generate_graph(indep_courses, course_prereqs)
-
-    # break up cycles if they are redundant (ex: class C requires A and B, but B requires A)
-    for cycle in nx.cycle_basis(G.to_undirected()):
-        # check if there is a distinct head and tail for a cycle, and head is connected directly to tail
-        head = None
-        tail = None
-        for i in cycle:
-            others = cycle.copy()
-            others.remove(i)
-            ancestors = nx.algorithms.dag.ancestors(G, i)
-            descendants = nx.algorithms.dag.descendants(G, i)
-            if all(o in ancestors for o in others):
-                head = i
-            elif all(o in descendants for o in others):
-                tail = i
-        if G.has_edge(tail, head):
-            # find the other predecessor of head for the cycle
-            other_adj = [adj for adj in cycle if adj in G.predecessors(head) and adj != tail]
-            if len(other_adj):
-                # check if it's an OR or an AND (don't remove if it's an OR)
-                false_pos = False
-                for (k, v) in courses:
-                    if k == head:
-                       for reqs in v:
-                           if other_adj[0] in reqs and tail in reqs:
-                               false_pos = True
-                               break
-                       break
-
-            if not false_pos:
-                print("removing edge from {} to {}".format(tail,head))
-                G.remove_edge(tail,head)
-
-    #print(nx.algorithms.dag.dag_longest_path(G))
-    #G.remove_nodes_from(list(nx.isolates(G)))
-    fig = generate_figure(G)
-    return G, course_desc, fig, courses
-
-# preload the data for specific departments, so they don't need to be fetched every time
-dept_cache = dict()
-for i in depts:
-    print("caching {}".format(i))
-    dept_cache[i] = get_dept_info(i)
-
-
-@app.callback([Output('title', 'children'),Output('graph', 'figure'),Output('desc', 'children')],[Input('dept-select', 'value'), Input('graph', 'hoverData'),Input('graph','selectedData')])
-def highlight_prereqs(dept,hoverData,selectedData):
+def reload_depts(changed):
+    """
+    Rebuilds the cached info of changed departments off the request path, and swaps each entry in one assignment.
+    Callbacks keep using the entry they started with, so they never see a half-updated department.
+    :param changed: changed departments (None means any department)
+    :type changed: set
+    :return: None
+    """
+    reload_offerings_index()
+    plan_service.clear()
+    for dept in list(dept_cache):
+        if None not in changed and dept not in changed:
+            continue
+        old = dept_cache[dept]
+        new = old.copy()
+        if update_dept_info(new):
+            new.generation = old.generation + 1
+            dept_cache[dept] = new
+            print("reloaded {} (generation {})".format(dept, new.generation))
+
+# watch the data directories, and reload departments when their data changes (DATA_WATCH_INTERVAL=0 disables)
+watch_interval = float(os.environ.get('DATA_WATCH_INTERVAL', '30'))
+if watch_interval > 0 and not plan_worker:
+    data_watcher = DataWatcher(reload_depts, watch_interval)
+    data_watcher.start()
+
+
+@app.callback([Output('title', 'children'),Output('graph', 'figure'),Output('desc', 'children'),Output('lod-state', 'data')],
+              [Input('dept-select', 'value'), Input('graph', 'hoverData'),Input('graph','selectedData')],[State('lod-state', 'data')])
+def highlight_prereqs(dept,hoverData,selectedData,lod_state):
     """
     Callback for click and hover events from Dash.
     Using the event node, it selects a course and its prereqs, and lowers the opacity of unrelated courses (and lines).
     Returns original figure with modified graphics (selection + opacity).
 
+    Big departments are shown as a collapsed level-of-detail view (see course_graph.LodView) instead: clicking a
+    course centers the view on it, clicking an aggregate node expands it, and clearing the selection resets the view.
+    Only the collapsed view is sent, so the figure stays small however big the department is.
+
     :param hoverData: hover data
     :type hoverData: dict or None
     :param selectedData: selected data
     :type selectedData: dict or None
-    :return: plotly.graph_objs.Figure
+    :param lod_state: {'dept': str, 'generation': int, 'selected': str or None, 'expanded': list} of the level-of-detail view
+    :type lod_state: dict or None
+    :return: dict (plotly figure)
     """
-    G, course_desc, fig, courses = dept_cache[dept]
+    # take a single snapshot of the department, in case it is reloaded while this callback runs
+    info = get_cached_dept(dept)
     title = "{} Undergraduate Courses".format(dept)
-    prereqs = []
     desc = ""
     point = None
 
+    # departments without a full figure are shown through the level-of-detail view
+    view = info
+    if info.fig is None:
+        # start over when the department changes or is reloaded, since the selected and expanded nodes may be gone
+        if not lod_state or lod_state.get('dept') != dept or lod_state.get('generation') != info.generation:
+            lod_state = dict(dept=dept, generation=info.generation, selected=None, expanded=[])
+        triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+        if 'graph.selectedData' in triggered:
+            clicked = selectedData['points'][0]['customdata'] if selectedData and selectedData.get('points') else None
+            current = info.get_lod_view(lod_state['selected'], lod_state['expanded'])
+            if clicked is None:
+                lod_state = dict(lod_state, selected=None, expanded=[])
+            elif clicked in current.members:
+                lod_state = dict(lod_state, expanded=lod_state['expanded'] + [clicked])
+            elif clicked in info.G:
+                lod_state = dict(lod_state, selected=clicked)
+        view = info.get_lod_view(lod_state['selected'], lod_state['expanded'])
+    # highlight a copy, since the cached figure is shared by concurrent callbacks (see the Procfile's threaded workers)
+    fig = view.fig.to_dict()
+
     # if there's an error here, that means the selected node is from the old plot, so we don't need to highlight anything
     try:
         # extract the point id from event data
@@ -244,37 +142,27 @@ def highlight_prereqs(dept,hoverData,selectedData):
         elif selectedData:
             point = selectedData['points'][0]['customdata']
 
-        # obtain list of immediate prereqs from scraper, full prereqs from graph, and fill the description template
-        if point:
-            desc_list = course_desc[dept + " " + str(point)]
-            prereqs = list(nx.algorithms.dag.ancestors(G, point))
-            immediate_prereqs = next(c for c in courses if c[0] == point)[1]
-            if not immediate_prereqs:
-                prereqs_str = 'None'
-            else:
-                prereqs_str = ', '.join(" or ".join(i) for i in immediate_prereqs)
-            desc = desc_tmpl.format(dept + " " + str(point), desc_list[0], prereqs_str, desc_list[1])
-
-        # obtain node indices for dash to select
-        prereqs.append(point)
-        prereq_index = [i for i, e in enumerate(G.nodes()) if e in prereqs]
+        # obtain the description, selected nodes and highlighted edges for the course (cached per course)
+        desc, prereq_index, edge_on = view.get_hover_info(point)
 
-        # highlight all of the nodes if none are selected
-        if not prereq_index:
-            prereq_index = list(range(len(G.nodes())))
-
-        fig['data'][0]['selectedpoints'] = prereq_index
+        fig['data'][-1]['selectedpoints'] = prereq_index
 
         # change the opacity for edges which are on the prerequisite tree for selected course
-        for i,(j,k) in enumerate(G.edges()):
-            if j in prereqs and k in prereqs:
-                fig['layout']['shapes'][i]['line']['color'] = 'rgb(127,127,127)'
-            else:
-                fig['layout']['shapes'][i]['line']['color'] = 'rgba(127,127,127,0.5)'
+        # (WebGL figures have no shapes, their edges are regrouped into the highlighted and dimmed traces instead)
+        if len(fig['data']) > 1:
+            for trace, (x, y) in zip(fig['data'][:-1], get_edge_segments(view.G, view.pos, edge_on)):
+                trace['x'] = x
+                trace['y'] = y
+        else:
+            for i, on in enumerate(edge_on):
+                if on:
+                    fig['layout']['shapes'][i]['line']['color'] = 'rgb(127,127,127)'
+                else:
+                    fig['layout']['shapes'][i]['line']['color'] = 'rgba(127,127,127,0.5)'
     except:
         pass
 
-    return title, fig, desc
+    return title, fig, desc, lod_state
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,86 @@
+import os
+import re
+import threading
+
+from offerings import QUARTER_DIR, STORE_PATH
+
+RAW_DIR = './raw_course_data/'
+
+def get_data_files(directories=(RAW_DIR, QUARTER_DIR)):
+    '''
+    Returns the modification time of every department data file, i.e. raw_course_data/DEPT.txt,
+    quarter_data/DEPT_TERM.txt and the offerings store.
+
+    :param: directories
+    :type: tuple
+
+    :return: dict
+    '''
+    files = dict()
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if re.fullmatch('[A-Z]+(_[A-Z][A-Z0-9][0-9]{2})?\\.txt', entry.name) or entry.path == STORE_PATH:
+                files[entry.path] = entry.stat().st_mtime
+
+    return files
+
+def get_file_dept(path):
+    '''
+    Returns the department a data file belongs to, or None if it may hold any department (the offerings store).
+
+    :param: path
+    :type: str
+
+    :return: str or None
+    '''
+    if path == STORE_PATH:
+        return None
+
+    return re.match('[A-Z]+', os.path.basename(path)).group()
+
+class DataWatcher(threading.Thread):
+    '''
+    Background thread that polls the data directories, and calls on_change(depts) with the set of
+    departments whose files were added, modified or removed (None in the set means "any department").
+    Files written while on_change() runs are not reported again, and failed reloads are retried on the next poll.
+    '''
+    def __init__(self, on_change, interval=30, directories=(RAW_DIR, QUARTER_DIR)):
+        assert callable(on_change)
+        assert interval > 0
+
+        super().__init__(name='data-watcher', daemon=True)
+        self.on_change = on_change
+        self.interval = interval
+        self.directories = directories
+        self.files = get_data_files(directories)
+        self._stop_event = threading.Event()
+
+    def poll(self):
+        '''
+        Checks the data directories once, and calls on_change() if anything changed.
+
+        :return: set
+        '''
+        files = get_data_files(self.directories)
+        changed = {path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)}
+        if not changed:
+            return set()
+
+        # only take a new snapshot once the change was handled, so failed reloads are retried
+        depts = {get_file_dept(path) for path in changed}
+        try:
+            self.on_change(depts)
+            self.files = get_data_files(self.directories)
+        except Exception as e:
+            print('unable to reload {}: {}'.format(', '.join(sorted(d or '*' for d in depts)), e))
+
+        return depts
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,226 @@
+import gzip
+import json
+import os
+
+from course_graph import get_dept_info
+from analytics import get_avg_num_prereqs, get_node_metrics
+from strip_catalogue import iterate_plan, PLAN_QUARTERS
+from offerings import next_term
+
+# columns of each record kind, used for the columnar format
+SCHEMAS = {
+    'edges': [('dept', 'string'), ('prereq', 'string'), ('course', 'string'), ('or_group', 'string'), ('weight', 'float64')],
+    'hover': [('dept', 'string'), ('course', 'string'), ('title', 'string'), ('prereqs', 'string'), ('ancestors', 'list<string>')],
+    'metrics': [('dept', 'string'), ('course', 'string'), ('in_degree', 'int64'), ('out_degree', 'int64'),
+                ('num_ancestors', 'int64'), ('num_descendants', 'int64')],
+    'depts': [('dept', 'string'), ('num_courses', 'int64'), ('num_edges', 'int64'), ('avg_num_prereqs', 'float64')],
+    'plans': [('preset', 'string'), ('step', 'int64'), ('term', 'string'), ('courses', 'list<string>')],
+}
+
+FORMATS = ('jsonl', 'parquet')
+
+def iter_edges(info):
+    """
+    Yields the edges of a department graph, tagged with the id of the OR group (set of interchangeable prereqs)
+    they belong to. Ids are of the form 'DEPT NUM/i', for the i-th prereq group of the course.
+    :param info: department info from course_graph.get_dept_info()
+    :type info: course_graph.DeptInfo
+    :return: generator(dict)
+    """
+    groups = dict()
+    for k, v in info.courses:
+        for i, reqs in enumerate(v or []):
+            for j in reqs:
+                if j and j.startswith(info.dept + ' '):
+                    groups.setdefault((j.split()[1].lstrip('0'), k), i)
+
+    for u, v, w in info.G.edges.data('weight'):
+        yield dict(dept=info.dept, prereq=u, course=v, or_group='{} {}/{}'.format(info.dept, v, groups.get((u, v), 0)), weight=w)
+
+def iter_hover(info):
+    """
+    Yields the hover index of a department graph: the description, immediate prereqs and full prereqs of each course.
+    :param info: department info from course_graph.get_dept_info()
+    :type info: course_graph.DeptInfo
+    :return: generator(dict)
+    """
+    courses = dict(info.courses)
+    for n in info.G.nodes():
+        title = info.course_desc.get(info.dept + ' ' + n, [''])[0]
+        prereqs = courses.get(n)
+        yield dict(dept=info.dept, course=n, title=title,
+                   prereqs=', '.join(' or '.join(str(j) for j in i) for i in prereqs) if prereqs else 'None',
+                   ancestors=sorted(info.ancestors[n]))
+
+def iter_metrics(info):
+    """
+    Yields the graph metrics of every course in a department (see analytics.get_node_metrics()).
+    :param info: department info from course_graph.get_dept_info()
+    :type info: course_graph.DeptInfo
+    :return: generator(dict)
+    """
+    for n, metrics in get_node_metrics(info.G, info.ancestors).items():
+        yield dict(dept=info.dept, course=n, **metrics)
+
+def iter_dept_records(info):
+    """
+    Yields (kind, record) pairs for everything exported about a department: edges, hover index, metrics and summary.
+    :param info: department info from course_graph.get_dept_info()
+    :type info: course_graph.DeptInfo
+    :return: generator(tuple)
+    """
+    for kind, records in (('edges', iter_edges(info)), ('hover', iter_hover(info)), ('metrics', iter_metrics(info))):
+        for record in records:
+            yield kind, record
+    yield 'depts', dict(dept=info.dept, num_courses=info.G.number_of_nodes(), num_edges=info.G.number_of_edges(),
+                        avg_num_prereqs=get_avg_num_prereqs(info.courses, True))
+
+def iter_plans(presets, max_num=5, start_qtr=1, num_iterations=10, quarters=None):
+    """
+    Yields one record per quarter of the best plan (see strip_catalogue.iterate_plan()) for each preset.
+    :param presets: preset name -> list of courses
+    :type presets: dict
+    :param max_num: max number of courses per quarter
+    :type max_num: int
+    :param start_qtr: index of the starting quarter in quarters
+    :type start_qtr: int
+    :param num_iterations: number of plans to take the shortest of
+    :type num_iterations: int
+    :param quarters: quarter window, defaults to strip_catalogue.PLAN_QUARTERS
+    :type quarters: list
+    :return: generator(dict)
+    """
+    assert isinstance(presets, dict)
+
+    quarters = quarters or PLAN_QUARTERS
+    for name, course_list in presets.items():
+        term = quarters[start_qtr % len(quarters)]
+        for step, courses in enumerate(iterate_plan(course_list, max_num, start_qtr, num_iterations, quarters)):
+            yield dict(preset=name, step=step, term=term, courses=courses)
+            term = next_term(term)
+
+class JsonLinesWriter:
+    """
+    Writes records as JSON Lines, gzipped if the path ends with .gz.
+    """
+    def __init__(self, path):
+        self.f = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self.f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.f.close()
+
+class ParquetWriter:
+    """
+    Writes records to a Parquet file in row groups of batch_size records. Requires pyarrow.
+    """
+    def __init__(self, path, kind, batch_size=4096):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('pyarrow is required for the parquet export format')
+
+        types = {'string': pa.string(), 'int64': pa.int64(), 'float64': pa.float64(), 'list<string>': pa.list_(pa.string())}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[t]) for name, t in SCHEMAS[kind]])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def open_writer(out_dir, kind, fmt):
+    """
+    Opens a writer for a record kind (see SCHEMAS) in the given format (see FORMATS).
+    :param out_dir: output directory
+    :type out_dir: str
+    :param kind: record kind
+    :type kind: str
+    :param fmt: output format
+    :type fmt: str
+    :return: JsonLinesWriter or ParquetWriter
+    """
+    assert kind in SCHEMAS, 'kind error: must be one of ' + ', '.join(SCHEMAS)
+    assert fmt in FORMATS, 'fmt error: must be one of ' + ', '.join(FORMATS)
+
+    if fmt == 'jsonl':
+        return JsonLinesWriter(os.path.join(out_dir, kind + '.jsonl.gz'))
+    return ParquetWriter(os.path.join(out_dir, kind + '.parquet'), kind)
+
+def export_records(records, out_dir, kinds, formats=('jsonl',)):
+    """
+    Streams (kind, record) pairs to one file per kind and format in out_dir. Returns the number of records written per kind.
+    :param records: (kind, record) pairs, e.g. from iter_dept_records()
+    :type records: iterable
+    :param out_dir: output directory, created if it doesn't exist
+    :type out_dir: str
+    :param kinds: record kinds to open files for (see SCHEMAS)
+    :type kinds: list
+    :param formats: output formats (see FORMATS)
+    :type formats: tuple
+    :return: dict
+    """
+    assert isinstance(out_dir, str)
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    writers = {kind: [open_writer(out_dir, kind, fmt) for fmt in formats] for kind in kinds}
+    counts = dict.fromkeys(kinds, 0)
+    try:
+        for kind, record in records:
+            for writer in writers[kind]:
+                writer.write(record)
+            counts[kind] += 1
+    finally:
+        for kind_writers in writers.values():
+            for writer in kind_writers:
+                writer.close()
+
+    return counts
+
+def export_all(depts, out_dir, formats=('jsonl',), presets=None, quarters=None, **plan_args):
+    """
+    Streams the graph edges, hover index and metrics of every department, and the plans of every preset,
+    to out_dir in each of the given formats. Departments are processed one at a time, so memory stays flat.
+    Returns the number of records written per kind.
+    :param depts: department codes
+    :type depts: list
+    :param out_dir: output directory, created if it doesn't exist
+    :type out_dir: str
+    :param formats: output formats (see FORMATS)
+    :type formats: tuple
+    :param presets: preset name -> list of courses to plan, no plans are exported if not given
+    :type presets: dict or None
+    :param quarters: quarters a course must be offered in to be in the graph (see course_graph.get_dept_info())
+    :type quarters: list
+    :param plan_args: extra arguments for iter_plans()
+    :return: dict
+    """
+    assert isinstance(depts, list)
+
+    def records():
+        for dept in depts:
+            for record in iter_dept_records(get_dept_info(dept, quarters, layout=False)):
+                yield record
+        if presets:
+            for record in iter_plans(presets, **plan_args):
+                yield 'plans', record
+
+    kinds = ['edges', 'hover', 'metrics', 'depts'] + (['plans'] if presets else [])
+    return export_records(records(), out_dir, kinds, formats)
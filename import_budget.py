@@ -0,0 +1,80 @@
+'''
+Checks that each module imports within its time budget, and without pulling in libraries it only needs later
+(scraping, layout and plotting libraries). Each import is measured in a fresh interpreter with -X importtime.
+
+Usage: python import_budget.py [runs]
+'''
+import os
+import re
+import subprocess
+import sys
+
+# module -> max cumulative import time in seconds
+BUDGETS = {
+    'offerings': 0.05,
+    'strip_catalogue': 0.1,
+    'plan_service': 0.15,
+    'course_graph': 0.5,
+    'analytics': 0.5,
+    'export': 0.6,
+    'whatif': 0.6,
+    'dash_viz': 3.0,
+}
+
+# libraries that must only be imported once they are actually used
+DEFERRED = ['requests', 'bs4', 'pygraphviz', 'plotly', 'pyarrow']
+
+# dash_viz needs plotly for dash itself, so only the scraping and layout libraries are checked there
+DEFERRED_EXCEPTIONS = {'dash_viz': ['plotly']}
+
+def measure_import(module):
+    '''
+    Imports module in a fresh interpreter, and returns its cumulative import time (in seconds)
+    and the deferred libraries that were loaded.
+
+    :param: module
+    :type: str
+
+    :return: float, list
+    '''
+    assert type(module) is str, 'module error: type must be string'
+
+    code = 'import sys, {}; print(",".join(m for m in {!r} if m in sys.modules))'.format(module, DEFERRED)
+    env = dict(os.environ, PRELOAD_DEPTS='0', DATA_WATCH_INTERVAL='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, 'unable to import {}:\n{}'.format(module, result.stderr)
+
+    # lines are of the form "import time: self [us] | cumulative | imported package"
+    cumulative = None
+    for line in result.stderr.splitlines():
+        match = re.match('import time:\\s+\\d+\\s+\\|\\s+(\\d+)\\s+\\|\\s?(\\S+)$', line)
+        if match and match.group(2) == module:
+            cumulative = int(match.group(1)) / 1e6
+
+    loaded = [m for m in result.stdout.strip().split(',') if m and m not in DEFERRED_EXCEPTIONS.get(module, [])]
+    return cumulative, loaded
+
+def check_budgets(runs=3):
+    '''
+    Measures every module in BUDGETS (best of runs), prints a report, and returns whether all are within budget.
+
+    :param: runs
+    :type: int
+
+    :return: bool
+    '''
+    ok = True
+    for module, budget in BUDGETS.items():
+        measurements = [measure_import(module) for i in range(runs)]
+        best = min(m[0] for m in measurements)
+        loaded = measurements[0][1]
+        passed = best <= budget and not loaded
+        ok = ok and passed
+        print('{:<16} {:7.3f}s / {:5.2f}s {}{}'.format(module, best, budget, 'ok' if passed else 'FAIL',
+                                                       ' (loaded ' + ', '.join(loaded) + ')' if loaded else ''))
+
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if check_budgets(int(sys.argv[1]) if len(sys.argv) > 1 else 3) else 1)
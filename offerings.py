@@ -0,0 +1,503 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+
+# academic seasons in calendar order (summer sessions are recorded, but not used for planning)
+SEASONS = ('WI', 'SP', 'S1', 'S2', 'S3', 'FA')
+REGULAR_SEASONS = ('WI', 'SP', 'FA')
+
+# minimum fraction of past terms of a season a course must have been offered in to be projected
+PROJECTION_MIN_FREQ = 0.5
+
+QUARTER_DIR = './quarter_data/'
+STORE_PATH = QUARTER_DIR + 'offerings.json.gz'
+
+def term_key(term):
+    '''
+    Returns a sortable key for a term code of the form FA19, WI20, SP20, etc.
+
+    :param: term
+    :type: str
+
+    :return: tuple
+    '''
+    assert type(term) is str, 'term error: type must be string'
+    assert re.fullmatch('[A-Z][A-Z0-9][0-9]{2}', term), 'term error: must be of the form FA19'
+    assert term[:2] in SEASONS, 'term error: unknown season ' + term[:2]
+
+    return (2000 + int(term[2:]), SEASONS.index(term[:2]))
+
+def next_term(term):
+    '''
+    Returns the regular (non-summer) term following the given term, e.g. SP19 -> FA19 -> WI20.
+
+    :param: term
+    :type: str
+
+    :return: str
+    '''
+    year, season = term_key(term)
+    for s in SEASONS[season + 1:]:
+        if s in REGULAR_SEASONS:
+            return s + term[2:]
+
+    return REGULAR_SEASONS[0] + '{:02d}'.format((year + 1) % 100)
+
+def term_range(start, end):
+    '''
+    Returns the list of regular terms from start to end (inclusive).
+
+    :param: start
+    :type: str
+
+    :param: end
+    :type: str
+
+    :return: list
+    '''
+    assert term_key(start) <= term_key(end), 'term error: start must not be after end'
+
+    terms = []
+    cur = start if start[:2] in REGULAR_SEASONS else next_term(start)
+    while term_key(cur) <= term_key(end):
+        terms.append(cur)
+        cur = next_term(cur)
+
+    return terms
+
+class OfferingsIndex:
+    '''
+    Course-by-term bitmap of quarter offerings for all departments.
+
+    Each term is assigned a bit (in the order it was first recorded), and every course
+    ('CSE 20', 'MATH 20A', ...) maps to the mask of terms it was offered in, so membership
+    in a term, or in any of a set of terms, is a single bitwise test.
+    '''
+    def __init__(self):
+        self.terms = []        # recorded terms, sorted chronologically
+        self.term_bits = {}    # term -> bit index
+        self.dept_terms = {}   # dept -> mask of terms recorded for the department
+        self.dept_courses = {} # dept -> set of course numbers seen in any term
+        self.courses = {}      # 'DEPT NUM' -> mask of terms offered
+        self.sources = {}      # quarter file name -> [mtime in ns, size] when it was merged, see merge_quarter_files()
+        self._projections = {} # min_freq -> {season: set of courses}, see projection()
+
+    def add_term(self, term):
+        '''
+        Registers a term column (if not already present) and returns its bit index.
+
+        :param: term
+        :type: str
+
+        :return: int
+        '''
+        if term not in self.term_bits:
+            term_key(term)
+            self.term_bits[term] = len(self.term_bits)
+            self.terms.append(term)
+            self.terms.sort(key=term_key)
+
+        return self.term_bits[term]
+
+    def add(self, dept, term, course_nums):
+        '''
+        Records the course numbers offered by a department in a term, replacing any previous record.
+
+        :param: dept
+        :type: str
+
+        :param: term
+        :type: str
+
+        :param: course_nums
+        :type: iterable of str
+
+        :return: None
+        '''
+        assert type(dept) is str and dept != '', 'dept error: must be non-empty string'
+
+        bit = 1 << self.add_term(term)
+        known = self.dept_courses.setdefault(dept, set())
+
+        # clear the old column for this department before writing the new one
+        if self.dept_terms.get(dept, 0) & bit:
+            for num in known:
+                self.courses[dept + ' ' + num] &= ~bit
+
+        for num in course_nums:
+            num = num.strip()
+            if num == '':
+                continue
+            known.add(num)
+            course = dept + ' ' + num
+            self.courses[course] = self.courses.get(course, 0) | bit
+
+        self.dept_terms[dept] = self.dept_terms.get(dept, 0) | bit
+        self._projections.clear()
+
+    def has(self, dept, term):
+        '''
+        Returns whether offerings have been recorded for the department in the term.
+
+        :param: dept
+        :type: str
+
+        :param: term
+        :type: str
+
+        :return: bool
+        '''
+        return term in self.term_bits and bool(self.dept_terms.get(dept, 0) >> self.term_bits[term] & 1)
+
+    def term_mask(self, terms):
+        '''
+        Returns the bitmask for a collection of terms (unrecorded terms are ignored).
+
+        :param: terms
+        :type: iterable of str
+
+        :return: int
+        '''
+        mask = 0
+        for term in terms:
+            if term in self.term_bits:
+                mask |= 1 << self.term_bits[term]
+
+        return mask
+
+    def offered(self, course, term):
+        '''
+        Returns whether the course (e.g. 'CSE 20') is offered in the term.
+
+        :param: course
+        :type: str
+
+        :param: term
+        :type: str
+
+        :return: bool
+        '''
+        bit = self.term_bits.get(term)
+        return bit is not None and bool(self.courses.get(course, 0) >> bit & 1)
+
+    def offered_any(self, course, terms):
+        '''
+        Returns whether the course is offered in any of the terms. terms may be a precomputed term_mask().
+
+        :param: course
+        :type: str
+
+        :param: terms
+        :type: int or iterable of str
+
+        :return: bool
+        '''
+        mask = terms if isinstance(terms, int) else self.term_mask(terms)
+        return bool(self.courses.get(course, 0) & mask)
+
+    def offered_in(self, dept, terms):
+        '''
+        Returns the set of course numbers the department offers in any of the terms.
+
+        :param: dept
+        :type: str
+
+        :param: terms
+        :type: str or iterable of str
+
+        :return: set
+        '''
+        mask = self.term_mask([terms] if isinstance(terms, str) else terms)
+        return {num for num in self.dept_courses.get(dept, ()) if self.courses[dept + ' ' + num] & mask}
+
+    def projection(self, min_freq=PROJECTION_MIN_FREQ):
+        '''
+        Returns, for each season, the set of courses expected to be offered in a future term of that season,
+        i.e. courses offered in at least min_freq of the recorded terms of that season for their department.
+        Computed once per min_freq and reused until the index changes.
+
+        :param: min_freq
+        :type: float
+
+        :return: dict
+        '''
+        assert 0 < min_freq <= 1, 'min_freq error: must be in (0, 1]'
+
+        if min_freq not in self._projections:
+            season_masks = self._season_masks()
+            projected = {season: set() for season in SEASONS}
+            for dept, nums in self.dept_courses.items():
+                for season, season_mask in season_masks.items():
+                    projected[season].update(dept + ' ' + num for num in nums
+                                             if self._is_projected(dept, dept + ' ' + num, season_mask, min_freq))
+            self._projections[min_freq] = projected
+
+        return self._projections[min_freq]
+
+    def _season_masks(self):
+        return {season: self.term_mask(t for t in self.terms if t[:2] == season) for season in SEASONS}
+
+    def _is_projected(self, dept, course, season_mask, min_freq):
+        recorded = bin(self.dept_terms[dept] & season_mask).count('1')
+        return recorded > 0 and bin(self.courses.get(course, 0) & season_mask).count('1') >= min_freq * recorded
+
+    def available(self, course, term, min_freq=PROJECTION_MIN_FREQ):
+        '''
+        Returns whether the course is offered in the term, using the recorded offerings if the course's department
+        has been recorded for the term, and the projection() otherwise.
+
+        :param: course
+        :type: str
+
+        :param: term
+        :type: str
+
+        :param: min_freq
+        :type: float
+
+        :return: bool
+        '''
+        if self.has(course.split(' ')[0], term):
+            return self.offered(course, term)
+
+        return course in self.projection(min_freq)[term[:2]]
+
+    def available_in(self, dept, terms, min_freq=PROJECTION_MIN_FREQ):
+        '''
+        Returns the set of course numbers the department offers (or is projected to offer) in any of the terms.
+
+        :param: dept
+        :type: str
+
+        :param: terms
+        :type: iterable of str
+
+        :param: min_freq
+        :type: float
+
+        :return: set
+        '''
+        terms = list(terms)
+        nums = self.offered_in(dept, [term for term in terms if self.has(dept, term)])
+        for term in terms:
+            if not self.has(dept, term):
+                nums.update(num for num in self.dept_courses.get(dept, ())
+                            if dept + ' ' + num in self.projection(min_freq)[term[:2]])
+
+        return nums
+
+    def copy(self):
+        '''
+        Returns a copy of the index (including computed projections) that can be modified independently.
+
+        :return: OfferingsIndex
+        '''
+        index = OfferingsIndex()
+        index.terms = list(self.terms)
+        index.term_bits = dict(self.term_bits)
+        index.dept_terms = dict(self.dept_terms)
+        index.dept_courses = {dept: set(nums) for dept, nums in self.dept_courses.items()}
+        index.courses = dict(self.courses)
+        index.sources = dict(self.sources)
+        index._projections = {min_freq: {season: set(courses) for season, courses in projected.items()}
+                              for min_freq, projected in self._projections.items()}
+        return index
+
+    def set_offered(self, course, terms, offered):
+        '''
+        Marks a course as offered (or not) in the given terms, which must already be recorded for its department.
+        Unlike add(), only this course's projections are recomputed.
+
+        :param: course
+        :type: str
+
+        :param: terms
+        :type: iterable of str
+
+        :param: offered
+        :type: bool
+
+        :return: None
+        '''
+        dept, num = course.split(' ', 1)
+        mask = self.term_mask(terms)
+        assert self.dept_terms.get(dept, 0) & mask == mask, 'terms error: not recorded for ' + dept
+
+        self.dept_courses[dept].add(num)
+        if offered:
+            self.courses[course] = self.courses.get(course, 0) | mask
+        else:
+            self.courses[course] = self.courses.get(course, 0) & ~mask
+
+        season_masks = self._season_masks()
+        for min_freq, projected in self._projections.items():
+            for season, season_mask in season_masks.items():
+                if self._is_projected(dept, course, season_mask, min_freq):
+                    projected[season].add(course)
+                else:
+                    projected[season].discard(course)
+
+    def merge_quarter_files(self, directory=QUARTER_DIR, names=None):
+        '''
+        Reads per-quarter text files of the form DEPT_TERM.txt (one course number per line) into the index,
+        and records their modification time and size in sources. Returns the number of files merged.
+
+        :param: directory
+        :type: str
+
+        :param: names
+        :type: iterable of str, defaults to every quarter file in directory
+
+        :return: int
+        '''
+        files = []
+        for name, (mtime, size) in scan_quarter_files(directory).items():
+            if names is None or name in names:
+                dept, term = name[:-4].split('_')
+                files.append((term_key(term), dept, term, name, [mtime, size]))
+
+        # read in chronological order, so term bits are assigned deterministically
+        for _, dept, term, name, stat in sorted(files):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                self.add(dept, term, f.read().splitlines())
+            self.sources[name] = stat
+
+        return len(files)
+
+    def save(self, path=STORE_PATH):
+        '''
+        Writes the index to a single gzipped JSON file, stored column-wise per department.
+
+        :param: path
+        :type: str
+
+        :return: None
+        '''
+        terms = sorted(self.term_bits, key=self.term_bits.get)
+        depts = {}
+        for dept, nums in self.dept_courses.items():
+            nums = sorted(nums)
+            depts[dept] = {
+                'terms': format(self.dept_terms.get(dept, 0), 'x'),
+                'courses': nums,
+                'masks': [format(self.courses[dept + ' ' + num], 'x') for num in nums],
+            }
+
+        # write to a temp file of its own first, so readers never see a partial store, and other processes saving
+        # at the same time (server workers, batch jobs) never write to the same file
+        data = json.dumps({'terms': terms, 'depts': depts, 'sources': self.sources}, separators=(',', ':'), sort_keys=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.', dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(data.encode('utf-8'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        '''
+        Reads an index previously written by save().
+
+        :param: path
+        :type: str
+
+        :return: OfferingsIndex
+        '''
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = cls()
+        index.sources = data.get('sources', {})
+        for term in data['terms']:
+            index.add_term(term)
+        for dept, cols in data['depts'].items():
+            index.dept_terms[dept] = int(cols['terms'], 16)
+            index.dept_courses[dept] = set(cols['courses'])
+            for num, mask in zip(cols['courses'], cols['masks']):
+                index.courses[dept + ' ' + num] = int(mask, 16)
+
+        return index
+
+def scan_quarter_files(directory=QUARTER_DIR):
+    '''
+    Returns the modification time (in ns) and size of every DEPT_TERM.txt quarter file in directory.
+
+    :param: directory
+    :type: str
+
+    :return: dict
+    '''
+    files = {}
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            if re.fullmatch('([A-Z]+)_([A-Z][A-Z0-9][0-9]{2})\\.txt', entry.name):
+                stat = entry.stat()
+                files[entry.name] = [stat.st_mtime_ns, stat.st_size]
+
+    return files
+
+_index = None
+
+# serializes loading, reloading and saving the shared index within a process
+_lock = threading.RLock()
+
+def get_offerings_index():
+    '''
+    Returns the shared offerings index, loading the consolidated store on first use. The quarter text files
+    are the source of the store: if any was added, removed or modified (by time or size) since the store was
+    written, the index is rebuilt from them and the store is rewritten.
+
+    :return: OfferingsIndex
+    '''
+    global _index
+    if _index is None:
+        with _lock:
+            # another thread may have loaded it while this one waited
+            if _index is None:
+                index = None
+                if os.path.exists(STORE_PATH):
+                    try:
+                        index = OfferingsIndex.load(STORE_PATH)
+                    except (OSError, ValueError, KeyError):
+                        print('unable to read offerings store, rebuilding')
+
+                if index is None or index.sources != scan_quarter_files(QUARTER_DIR):
+                    index = OfferingsIndex()
+                    index.merge_quarter_files(QUARTER_DIR)
+                    save_offerings_index(index)
+                _index = index
+
+    return _index
+
+def save_offerings_index(index=None):
+    '''
+    Writes the given (or shared) offerings index to the consolidated store.
+
+    :param: index
+    :type: OfferingsIndex
+
+    :return: None
+    '''
+    with _lock:
+        try:
+            if not os.path.isdir(QUARTER_DIR):
+                os.mkdir(QUARTER_DIR)
+            (index or get_offerings_index()).save(STORE_PATH)
+        except OSError:
+            print('unable to write offerings store to directory')
+
+def reload_offerings_index():
+    '''
+    Drops the shared offerings index, so the next get_offerings_index() re-reads the store and quarter files.
+
+    :return: OfferingsIndex
+    '''
+    global _index
+    with _lock:
+        _index = None
+        return get_offerings_index()
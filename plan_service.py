@@ -0,0 +1,191 @@
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from strip_catalogue import iterate_plan, PLAN_QUARTERS
+from offerings import REGULAR_SEASONS, get_offerings_index, next_term
+
+# most courses a single plan request may ask for
+MAX_PLAN_COURSES = int(os.environ.get('MAX_PLAN_COURSES', '60'))
+
+def normalize_plan_request(course_list, max_num, start_term):
+    '''
+    Returns the cache key of a plan request: the sorted, de-duplicated course codes (e.g. 'cse20' -> 'CSE 20'),
+    max_num and start_term. Raises ValueError for invalid requests (not assert, since these checks guard the
+    web endpoint and must hold under python -O too).
+
+    :param course_list: list
+    :param max_num: int
+    :param start_term: str
+    :return: tuple
+    '''
+    if not isinstance(course_list, list) or len(course_list) == 0:
+        raise ValueError('courses error: must be a non-empty list')
+    if len(course_list) > MAX_PLAN_COURSES:
+        raise ValueError('courses error: at most {} courses per plan'.format(MAX_PLAN_COURSES))
+    if not isinstance(max_num, int) or max_num <= 0:
+        raise ValueError('max_num error: must be a positive int')
+    if not isinstance(start_term, str):
+        raise ValueError('start_term error: must be a string')
+
+    courses = set()
+    for course in course_list:
+        match = re.fullmatch('([A-Z]+)\\s*0*(\\d+[A-Z]*)', str(course).strip().upper())
+        if not match:
+            raise ValueError('courses error: invalid course code ' + str(course))
+        courses.add(match.group(1) + ' ' + match.group(2))
+
+    # plans only walk through regular quarters, so a summer session can't start one
+    start_term = start_term.strip().upper()
+    if not re.fullmatch('({})[0-9]{{2}}'.format('|'.join(REGULAR_SEASONS)), start_term):
+        raise ValueError('start_term error: must be a regular quarter of the form FA19, WI20 or SP20')
+
+    return (tuple(sorted(courses)), max_num, start_term)
+
+def is_known_dept(dept):
+    '''
+    Checks that a department has both catalogue data in raw_course_data/ and recorded offerings, so planning
+    it never has to scrape.
+
+    :param dept: str
+    :return: bool
+    '''
+    return os.path.exists('./raw_course_data/' + dept + '.txt') and bool(get_offerings_index().dept_terms.get(dept))
+
+def compute_plan(key, num_iterations):
+    '''
+    Runs the planner for a normalized request (see normalize_plan_request()), using the offerings of every
+    recorded quarter and projecting the rest. Runs in a worker process.
+
+    :param key: tuple
+    :param num_iterations: int
+    :return: list
+    '''
+    courses, max_num, start_term = key
+    quarters = get_offerings_index().terms or PLAN_QUARTERS
+    plan = iterate_plan(list(courses), max_num, 1, num_iterations, quarters, start_term)
+
+    result = []
+    term = start_term
+    for quarter_courses in plan:
+        result.append(dict(term=term, courses=quarter_courses))
+        term = next_term(term)
+
+    return result
+
+class PlanService:
+    '''
+    Serves plans from a worker pool. Results are kept in an LRU cache keyed by the normalized request, and
+    identical requests that arrive while a plan is being computed wait on the same computation.
+    '''
+    def __init__(self, max_size=256, workers=None, num_iterations=20, timeout=60):
+        assert max_size > 0 and num_iterations > 0
+
+        self.max_size = max_size
+        self.workers = workers
+        self.num_iterations = num_iterations
+        self.timeout = timeout
+        self.cache = OrderedDict()  # key -> plan, least recently used first
+        self.pending = dict()       # key -> future of the plan being computed
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get_plan(self, course_list, max_num, start_term):
+        '''
+        Returns the plan for the request, from the cache if possible.
+
+        :param course_list: list
+        :param max_num: int
+        :param start_term: str
+        :return: list
+        '''
+        key = normalize_plan_request(course_list, max_num, start_term)
+        unknown = sorted(set(course.split(' ')[0] for course in key[0] if not is_known_dept(course.split(' ')[0])))
+        if unknown:
+            raise ValueError('courses error: unknown department ' + ', '.join(unknown))
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+            future = self.pending.get(key)
+            started = future is None
+            if started:
+                # create the pool on first use, so it isn't inherited by forked server workers, and spawn its
+                # processes instead of forking, since this process already runs other threads (e.g. the data watcher)
+                if self.executor is None:
+                    self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                future = self.executor.submit(compute_plan, key, self.num_iterations)
+                self.pending[key] = future
+
+        # outside the lock, since the callback runs right away (and takes the lock) if the plan is already done
+        if started:
+            future.add_done_callback(lambda f: self._finish(key, f))
+
+        return future.result(self.timeout)
+
+    def _finish(self, key, future):
+        with self.lock:
+            # skip results of computations started before the last clear()
+            if self.pending.get(key) is not future:
+                return
+            del self.pending[key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            self.cache[key] = future.result()
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def clear(self):
+        '''
+        Drops all cached plans (e.g. after the data was reloaded). The worker pool is replaced too,
+        since each worker keeps its own copy of the data.
+
+        :return: None
+        '''
+        with self.lock:
+            self.cache.clear()
+            self.pending.clear()
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+def register_plan_routes(server, service):
+    '''
+    Adds the /api/plan endpoint to a Flask server. Takes either query parameters
+    (?courses=CSE 12,CSE 15L&max_num=5&start_term=FA19) or a JSON body with the same keys.
+    Requests for departments without local data (see is_known_dept()) are rejected rather than scraped.
+
+    :param server: flask.Flask
+    :param service: PlanService
+    :return: None
+    '''
+    from flask import request, jsonify
+
+    @server.route('/api/plan', methods=['GET', 'POST'])
+    def plan():
+        args = request.get_json(silent=True)
+        if args is None:
+            args = request.values
+        elif not isinstance(args, dict):
+            return jsonify(error='invalid request: the JSON body must be an object'), 400
+        courses = args.get('courses', [])
+        if isinstance(courses, str):
+            courses = [c for c in courses.split(',') if c.strip()]
+        try:
+            max_num = int(args.get('max_num', 5))
+            start_term = str(args.get('start_term', PLAN_QUARTERS[0]))
+            result = service.get_plan(courses, max_num, start_term)
+        except (AssertionError, ValueError, TypeError) as e:
+            return jsonify(error=str(e) or 'invalid request'), 400
+        except TimeoutError:
+            return jsonify(error='planning timed out'), 504
+        except Exception as e:
+            return jsonify(error='unable to plan: {}'.format(e)), 500
+
+        key = normalize_plan_request(courses, max_num, start_term)
+        return jsonify(courses=list(key[0]), max_num=max_num, start_term=key[2], plan=result)
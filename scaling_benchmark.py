@@ -0,0 +1,266 @@
+'''
+Measures how the runtime and memory of each pipeline stage grow with catalogue size, on synthetic catalogues
+(see synthetic_catalogue.py). Each scale is measured in a fresh interpreter, once for runtime and once with
+tracemalloc for memory. A stage that takes longer than the stage budget isn't run at larger scales, and a stage
+that hangs past the timeout is skipped on a rerun of that scale.
+
+Writes OUT/results.json and charts to OUT/scaling.html.
+
+Usage: python scaling_benchmark.py [--scales 1 10 100 1000] [--out benchmark] [--stage-budget 60] ...
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from synthetic_catalogue import BASE_COURSES, generate_catalogue, add_generator_args, get_generator_args
+
+# pipeline stages in the order they run, and the stages each depends on
+STAGES = ['offerings', 'data', 'graph', 'prune', 'ancestors', 'metrics', 'paths', 'layout', 'figure', 'serialize', 'plan']
+DEPENDS = {
+    'data': ['offerings'],
+    'graph': ['data'],
+    'prune': ['graph'],
+    'ancestors': ['prune'],
+    'metrics': ['ancestors'],
+    'paths': ['prune'],
+    'layout': ['prune'],
+    'figure': ['prune'],
+    'serialize': ['figure'],
+    'plan': ['offerings'],
+}
+
+def get_fallback_layout(G):
+    '''
+    Places nodes in rows by prereq depth (or in a grid, if the graph has cycles), for timing the figure stage when graphviz isn't installed.
+
+    :param G: networkx.DiGraph
+    :return: dict
+    '''
+    import networkx as nx
+
+    depth = dict()
+    rows = dict()
+    try:
+        for n in nx.algorithms.dag.topological_sort(G):
+            depth[n] = max([depth[p] + 1 for p in G.predecessors(n)] or [0])
+            rows.setdefault(depth[n], []).append(n)
+    except nx.NetworkXUnfeasible:
+        # cyclic graph, fall back to a grid
+        rows = {y: list(G.nodes())[y * 20:(y + 1) * 20] for y in range(-(-G.number_of_nodes() // 20))}
+    return {n: (x * 50.0, -y * 100.0) for y, row in rows.items() for x, n in enumerate(row)}
+
+def run_stages(dept, skip, result_path, memory=False, plan_iterations=5):
+    '''
+    Runs every pipeline stage on a department of the catalogue in the working directory, and writes the
+    seconds (or peak traced megabytes, if memory) of each stage to result_path as soon as it finishes.
+    Runs in the worker process.
+
+    :param dept: str
+    :param skip: stages not to run
+    :param result_path: str
+    :param memory: bool
+    :param plan_iterations: int
+    :return: dict
+    '''
+    from offerings import STORE_PATH, get_offerings_index
+    from course_graph import get_course_data, generate_graph, prune_cycles, get_ancestor_index, generate_layout, generate_figure
+    from analytics import get_node_metrics, get_flexibility
+    from strip_catalogue import iterate_plan
+    # import plotly up front, so the figure stage only measures building the figure
+    import plotly.graph_objs
+
+    # rebuild the offerings store from the quarter files every run
+    if os.path.exists(STORE_PATH):
+        os.remove(STORE_PATH)
+
+    state = dict()
+    results = dict()
+
+    def get_figure():
+        pos = state.get('pos')
+        if pos is None:
+            results['layout_fallback'] = True
+            pos = get_fallback_layout(state['G'])
+        state['fig'] = generate_figure(state['G'], pos)
+
+    def get_plan():
+        nums = sorted(get_offerings_index().dept_courses.get(dept, ()))
+        course_list = [dept + ' ' + num for num in nums]
+        return iterate_plan(course_list, max(5, len(course_list) // 20), 1, plan_iterations)
+
+    stages = {
+        'offerings': lambda: get_offerings_index(),
+        'data': lambda: state.update(data=get_course_data(dept)),
+        'graph': lambda: state.update(G=generate_graph(state['data'][2], state['data'][3])),
+        'prune': lambda: prune_cycles(state['G'], state['data'][0]),
+        'ancestors': lambda: state.update(ancestors=get_ancestor_index(state['G'])),
+        'metrics': lambda: get_node_metrics(state['G'], state['ancestors']),
+        'paths': lambda: get_flexibility(state['G']),
+        'layout': lambda: state.update(pos=generate_layout(state['G'])),
+        'figure': get_figure,
+        'serialize': lambda: results.update(payload_bytes=len(state['fig'].to_json())),
+        'plan': get_plan,
+    }
+
+    for stage in STAGES:
+        if stage in skip or any(results.get(d, dict()).get('status') != 'ok' for d in DEPENDS.get(stage, [])):
+            results[stage] = dict(status='skipped')
+            continue
+
+        # mark the stage as running, so a timeout can be traced back to it
+        results[stage] = dict(status='running')
+        write_results(results, result_path)
+
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            stages[stage]()
+            results[stage] = dict(status='ok', seconds=time.perf_counter() - start)
+        except Exception as e:
+            results[stage] = dict(status='error: {}'.format(e))
+        if memory:
+            results[stage]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+        if stage == 'graph' and 'G' in state:
+            results['nodes'] = state['G'].number_of_nodes()
+            results['edges'] = state['G'].number_of_edges()
+
+    write_results(results, result_path)
+    return results
+
+def write_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+
+def run_worker(directory, dept, skip, memory, timeout, plan_iterations):
+    '''
+    Runs run_stages() in a fresh interpreter in directory. If it doesn't finish within timeout seconds, the
+    stage it was running is marked as timed out, and the rest are run again without it.
+
+    :return: dict
+    '''
+    skip = set(skip)
+    result_path = os.path.join(directory, 'memory.json' if memory else 'runtime.json')
+    timed_out = dict()
+    while True:
+        if os.path.exists(result_path):
+            os.remove(result_path)
+        code = 'import scaling_benchmark as b; b.run_stages({!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            dept, sorted(skip), os.path.abspath(result_path), memory, plan_iterations)
+        env = dict(os.environ, LAYOUT_CACHE_DIR='',
+                   PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.abspath(__file__)), os.environ.get('PYTHONPATH', '')]))
+        try:
+            result = subprocess.run([sys.executable, '-c', code], cwd=directory, env=env, timeout=timeout,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+            assert os.path.exists(result_path), 'unable to run benchmark worker:\n' + result.stderr
+        except subprocess.TimeoutExpired:
+            pass
+
+        with open(result_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        running = [stage for stage in STAGES if results.get(stage, dict()).get('status') == 'running']
+        if not running:
+            results.update(timed_out)
+            return results
+        timed_out[running[0]] = dict(status='timeout')
+        skip.add(running[0])
+
+def run_benchmark(scales, out_dir, stage_budget=60, timeout=600, memory=True, plan_iterations=5, **generator_args):
+    '''
+    Generates a synthetic catalogue at each scale, and measures every stage on its first department.
+    Returns one record per scale.
+
+    :param scales: scales to measure, in increasing order (see synthetic_catalogue.generate_catalogue())
+    :type scales: list
+    :param out_dir: directory for the catalogues and results
+    :type out_dir: str
+    :param stage_budget: seconds a stage may take before it is skipped at larger scales
+    :type stage_budget: float
+    :param timeout: seconds a worker may run before its current stage is considered hung
+    :type timeout: float
+    :param memory: whether to also measure memory
+    :type memory: bool
+    :param plan_iterations: number of plans iterate_plan() takes the shortest of
+    :type plan_iterations: int
+    :param generator_args: extra arguments for generate_catalogue()
+    :return: list
+    '''
+    skip = set()
+    records = []
+    for scale in scales:
+        directory = os.path.join(out_dir, 'scale_{:g}'.format(scale))
+        start = time.perf_counter()
+        depts = generate_catalogue(directory, scale=scale, **generator_args)
+        print('scale {:g}: generated {} courses per department in {:.1f}s'.format(
+            scale, max(generator_args.get('depth', 6), int(BASE_COURSES * scale)), time.perf_counter() - start))
+
+        runtime = run_worker(directory, depts[0], skip, False, timeout, plan_iterations)
+        timed_out = set(stage for stage in STAGES if runtime[stage]['status'] == 'timeout')
+        memory_results = run_worker(directory, depts[0], skip | timed_out, True, timeout, plan_iterations) if memory else dict()
+
+        record = dict(scale=scale, courses=max(generator_args.get('depth', 6), int(BASE_COURSES * scale)),
+                      nodes=runtime.get('nodes'), edges=runtime.get('edges'), payload_bytes=runtime.get('payload_bytes'),
+                      layout_fallback=runtime.get('layout_fallback', False), stages=dict())
+        for stage in STAGES:
+            stage_record = dict(runtime[stage])
+            if 'peak_mb' in memory_results.get(stage, dict()):
+                stage_record['peak_mb'] = memory_results[stage]['peak_mb']
+            record['stages'][stage] = stage_record
+            if stage_record['status'] == 'timeout' or stage_record.get('seconds', 0) > stage_budget:
+                skip.add(stage)
+
+            if stage_record['status'] != 'ok':
+                print('  {:<10} {}'.format(stage, stage_record['status']))
+            else:
+                print('  {:<10} {:9.3f}s'.format(stage, stage_record['seconds']) +
+                      (' {:9.1f}MB'.format(stage_record['peak_mb']) if 'peak_mb' in stage_record else ''))
+        records.append(record)
+
+    with open(os.path.join(out_dir, 'results.json'), 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=1)
+    return records
+
+def plot_results(records, path):
+    '''
+    Charts the runtime and memory of each stage against the number of courses (log-log), to an html file.
+
+    :param records: list, from run_benchmark()
+    :param path: str
+    :return: None
+    '''
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=('runtime (s)', 'peak memory (MB)'))
+    for stage in STAGES:
+        for col, metric in ((1, 'seconds'), (2, 'peak_mb')):
+            points = [(r['courses'], r['stages'][stage][metric]) for r in records if metric in r['stages'][stage]]
+            if points:
+                x, y = zip(*points)
+                fig.add_trace(go.Scatter(x=x, y=y, name=stage, legendgroup=stage, showlegend=col == 1, mode='lines+markers'),
+                              row=1, col=col)
+    fig.update_xaxes(type='log', title_text='courses per department')
+    fig.update_yaxes(type='log')
+    fig.write_html(path, include_plotlyjs='cdn')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure pipeline stages on synthetic catalogues of increasing size.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100, 1000], help='catalogue scales (default: 1 10 100 1000)')
+    parser.add_argument('--out', default='benchmark', help='output directory (default: benchmark)')
+    parser.add_argument('--stage-budget', type=float, default=60, help='seconds before a stage is dropped at larger scales (default: 60)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds before a running stage is considered hung (default: 600)')
+    parser.add_argument('--no-memory', action='store_true', help="don't measure memory")
+    parser.add_argument('--plan-iterations', type=int, default=5, help='plans iterate_plan() takes the shortest of (default: 5)')
+    add_generator_args(parser)
+    args = parser.parse_args()
+
+    records = run_benchmark(sorted(args.scales), args.out, args.stage_budget, args.timeout, not args.no_memory,
+                            args.plan_iterations, **get_generator_args(args))
+    plot_results(records, os.path.join(args.out, 'scaling.html'))
+    print('wrote {} and {}'.format(os.path.join(args.out, 'results.json'), os.path.join(args.out, 'scaling.html')))
@@ -1,10 +1,11 @@
-import requests
 import re
 import os
 import time
 import random
 import scrapercleaner
-from bs4 import BeautifulSoup
+from offerings import QUARTER_DIR, get_offerings_index, save_offerings_index, next_term, term_key, term_range
+
+# NOTE: requests and bs4 are only imported when a page actually needs to be scraped, to keep imports fast
 
 def get_courses_for_major(major):
     '''
@@ -116,6 +117,9 @@ def get_lines_from_url(url):
     assert type(url) is str, 'url error: type must be string'
     assert url != '', 'major error: cannot be empty string'
 
+    import requests
+    from bs4 import BeautifulSoup
+
     # send get request to url and parse the result
     response = requests.get(url)
     soup = BeautifulSoup(response.text, 'html.parser')
@@ -204,7 +208,8 @@ def find_ending_helper(full_text, begin_str, mid_str, end_str, cur_index):
 
 def get_quarter_offerings(major, quarter):
     '''
-    Returns the list of courses offered in the given quarter and saves to file.
+    Returns the list of courses offered in the given quarter, and saves it to quarter_data/MAJOR_QUARTER.txt
+    and the offerings store.
 
     :param: major
     :type: str
@@ -219,13 +224,11 @@ def get_quarter_offerings(major, quarter):
     assert type(quarter) is str, 'quarter error: type must be string'
     assert quarter != '', 'quarter error: cannot be empty string'
 
-    try:
-        unique_list = []
-        with open('./quarter_data/' + major + "_" + quarter + '.txt', 'r', encoding='utf-8') as f:
-            for line in f:
-                unique_list.append(line.strip())
-        return unique_list
-    except:
+    # if already recorded, pull from the offerings store
+    index = get_offerings_index()
+    if index.has(major, quarter):
+        return sorted(index.offered_in(major, quarter))
+    else:
         # url for retrieving the class quarter schedule
         test_url = 'https://act.ucsd.edu/scheduleOfClasses/scheduleOfClassesStudentResult.htm'
 
@@ -249,6 +252,8 @@ def get_quarter_offerings(major, quarter):
             'schedOption9': True,
         }
 
+        import requests
+
         # start the html session and post to url
         s = requests.Session()
         first_page = s.post(test_url, data).text
@@ -272,13 +277,19 @@ def get_quarter_offerings(major, quarter):
         # unique the course list
         unique_list = list(set(course_list))
 
-        # write to file, appending course num to major
+        # write to file, the source of the offerings store, and merge it in (see offerings.merge_quarter_files())
+        name = major + "_" + quarter + '.txt'
         try:
-            f_write = open('./quarter_data/' + major + "_" + quarter + '.txt', 'w+', encoding='utf-8')
+            if not os.path.isdir(QUARTER_DIR):
+                os.mkdir(QUARTER_DIR)
+            f_write = open(QUARTER_DIR + name, 'w+', encoding='utf-8')
             f_write.writelines(str(course)+"\n" for course in unique_list)
             f_write.close()
-        except:
+            index.merge_quarter_files(QUARTER_DIR, [name])
+        except OSError:
             print('unable to write course info to directory')
+            index.add(major, quarter, unique_list)
+        save_offerings_index(index)
 
         return unique_list
 
@@ -375,79 +386,108 @@ def get_quarter_list(major, quarter):
     assert type(quarter) is str, 'quarter error: type must be string'
     assert quarter != '', 'quarter error: cannot be empty string'
 
-    # check if save directory exists, if not create
-    if not os.path.isdir("./quarter_data/"):
-        os.mkdir('./quarter_data/')
+    return get_quarter_offerings(major, quarter)
 
-    # if already searched, pull from file
-    if os.path.exists("./quarter_data/" + major + "_" + quarter + ".txt"):
-        f_read = open("./quarter_data/" + major + "_" + quarter + ".txt", "r", encoding="utf-8")
-        course_list = f_read.read().splitlines()
-        f_read.close()
+def get_offerings(major_list, quarter_list):
+    '''
+    Returns the shared offerings index (see offerings.OfferingsIndex). Majors that have no recorded quarters
+    at all are fetched for every quarter in quarter_list; quarters missing for an already recorded major are
+    left to the index's projection (see OfferingsIndex.available()).
 
-        return course_list
-    else:
-        return get_quarter_offerings(major, quarter)
+    :param: major_list
+    :type: iterable of str
+
+    :param: quarter_list
+    :type: iterable of str
+
+    :return: OfferingsIndex
+    '''
+    index = get_offerings_index()
+    for major in major_list:
+        if not index.dept_terms.get(major):
+            for quarter in quarter_list:
+                get_quarter_offerings(major, quarter)
+
+    return index
+
+# default window of quarters the planner uses recorded offerings for
+PLAN_QUARTERS = ['FA19', 'WI19', 'SP19']
+
+def get_prereq_map(major_list):
+    '''
+    Returns the prereq groups of every course in the given majors, keyed by full course code (e.g. 'ECE 35').
 
-def develop_plan(course_list, max_num, start_qtr):
+    :param major_list: iterable of str
+    :return: dict
+    '''
+    prereq_map = {}
+    for major in major_list:
+        prereq_list = get_clean_course_prereq(major)
+        prereq_map.update({major + ' ' + val[0]:val[1] or [] for val in prereq_list})
+
+    return prereq_map
+
+def develop_plan(course_list, max_num, start_qtr, quarters=None, start_term=None, offerings=None, prereq_map=None):
     '''
     Returns the fastest route to completion of the course list over quarters taking max_num courses per quarter.
 
+    The plan starts at quarters[start_qtr % len(quarters)] (or start_term, if given) and walks forward through
+    the regular quarters. Each quarter uses the recorded offerings if the course's department has been recorded
+    for it, and is projected from how often the course was offered in past quarters of the same season otherwise
+    (see OfferingsIndex.available()). Courses that can't be scheduled in any quarter are left out.
+
     :param course_list: list
     :param max_num: int
     :param start_qtr: int
+    :param quarters: list of quarter codes to start from and to fetch unrecorded majors for, defaults to PLAN_QUARTERS
+    :param start_term: str
+    :param offerings: OfferingsIndex to plan against, defaults to get_offerings()
+    :param prereq_map: prereq groups by course, defaults to get_prereq_map()
     :return: list
     '''
     assert isinstance(course_list, list)
     assert isinstance(max_num, int)
     assert isinstance(start_qtr, int)
     assert max_num > 0 and start_qtr > 0
+    assert quarters is None or (isinstance(quarters, list) and len(quarters) > 0)
+    assert start_term is None or isinstance(start_term, str)
+
+    quarters = quarters or PLAN_QUARTERS
 
     major_list = set()
     for course in course_list:
         major_list.add(re.search('[a-zA-Z]+', course).group())
 
-    fa_list = []
-    wi_list = []
-    sp_list = []
-    prereq_map = {}
-    for major in major_list:
-        fa_major_list = get_quarter_list(major, 'FA19')
-        fa_list.extend([major + ' ' + course for course in fa_major_list])
-
-        wi_major_list = get_quarter_list(major, 'WI19')
-        wi_list.extend([major + ' ' + course for course in wi_major_list])
-
-        sp_major_list = get_quarter_list(major, 'SP19')
-        sp_list.extend([major + ' ' + course for course in sp_major_list])
-
-        prereq_list = get_clean_course_prereq(major)
-        prereq_map.update({major + ' ' + val[0]:val[1] or [] for val in prereq_list})
-
-    fa_courses = [course for course in course_list if course in fa_list]
-
-    wi_courses = [course for course in course_list if course in wi_list]
-    sp_courses = [course for course in course_list if course in sp_list]
-    combined_courses = fa_courses.copy()
-    combined_courses.extend(wi_courses)
-    combined_courses.extend(sp_courses)
+    offerings = offerings or get_offerings(major_list, quarters)
+    prereq_map = prereq_map if prereq_map is not None else get_prereq_map(major_list)
 
-    course_quarter_list = []
-    course_quarter_list.append(fa_courses)
-    course_quarter_list.append(wi_courses)
-    course_quarter_list.append(sp_courses)
+    # set of courses available in each quarter, recorded or projected
+    term_courses = {}
+    def get_term_courses(term):
+        if term not in term_courses:
+            term_courses[term] = set(course for course in course_list if offerings.available(course, term))
+        return term_courses[term]
 
     final_plan = []
     cur_quarter = start_qtr
-    found_courses = [course for course in course_list if course in combined_courses]
+    cur_term = start_term or quarters[start_qtr % len(quarters)]
+
+    # a course can be scheduled if it is available in any quarter up to the last recorded one, or in the
+    # projected year after that (projections repeat every year)
+    last_term = max(offerings.terms + [cur_term], key=term_key)
+    last_term = next_term(next_term(next_term(last_term)))
+    lookahead = term_range(cur_term, last_term)
+    found_courses = set([course for course in course_list if any(course in get_term_courses(term) for term in lookahead)])
     needed_courses = set([course for course in found_courses if course in prereq_map.keys()])
 
     while len(needed_courses) != 0:
-        offered_quarter_courses = [course for course in course_quarter_list[cur_quarter % 3] if course in needed_courses]
+        # in course list order, which decides the courses taken when more than max_num are eligible
+        offered = get_term_courses(cur_term)
+        offered_quarter_courses = [course for course in course_list if course in offered and course in needed_courses]
 
         eligible_courses = [t_course for t_course in offered_quarter_courses \
-                            if not set([list(set(sublist).intersection(set(found_courses)))[random.randrange(len(set(sublist).intersection(set(found_courses))))]
-                                        for sublist in prereq_map[t_course] if list(set(sublist).intersection(set(found_courses))) != []]).intersection(needed_courses)]
+                            if not set([list(set(sublist).intersection(found_courses))[random.randrange(len(set(sublist).intersection(found_courses)))]
+                                        for sublist in prereq_map[t_course] if list(set(sublist).intersection(found_courses)) != []]).intersection(needed_courses)]
 
         if cur_quarter % 150 == 0:
             print('ERROR')
@@ -464,16 +504,19 @@ def develop_plan(course_list, max_num, start_qtr):
         final_plan.append(eligible_courses.copy())
         needed_courses.difference_update(eligible_courses)
         cur_quarter += 1
+        cur_term = next_term(cur_term)
 
     return final_plan
 
-def develop_plan_recursion(course_list, max_num, start_qtr):
+def develop_plan_recursion(course_list, max_num, start_qtr, quarters=None, start_term=None):
     '''
     Recursively generates all of the prereqs for a given course list, then runs the course planner.
 
     :param course_list: list
     :param max_num: int
     :param start_qtr: int
+    :param quarters: list of quarter codes, see develop_plan()
+    :param start_term: str
     :return: list
     '''
     assert isinstance(course_list, list)
@@ -491,9 +534,9 @@ def develop_plan_recursion(course_list, max_num, start_qtr):
         for course in last_courses:
             if course in cur_prereq_map_simple:
                 all_courses.update(cur_prereq_map_simple[course])
-        cur_prereq_map_simple = develop_plan_recursion_helper(all_courses)
+        cur_prereq_map_simple = develop_plan_recursion_helper(list(all_courses))
 
-    return develop_plan(all_courses, max_num, start_qtr)
+    return develop_plan(list(all_courses), max_num, start_qtr, quarters, start_term)
 
 def develop_plan_recursion_helper(course_list):
     '''
@@ -516,7 +559,7 @@ def develop_plan_recursion_helper(course_list):
     return {course: [sublist[random.randrange(len(sublist))] for sublist in prereq_map_init[course]] \
             for course in prereq_map_init}
 
-def iterate_plan(course_list, max_num, start_qtr, num_iterations):
+def iterate_plan(course_list, max_num, start_qtr, num_iterations, quarters=None, start_term=None, offerings=None, prereq_map=None):
     '''
     Takes the minimum length planner of num_interations executions of develop_plan
 
@@ -524,6 +567,10 @@ def iterate_plan(course_list, max_num, start_qtr, num_iterations):
     :param max_num: int
     :param start_qtr: int
     :param num_iterations: int
+    :param quarters: list of quarter codes, see develop_plan()
+    :param start_term: str
+    :param offerings: OfferingsIndex, see develop_plan()
+    :param prereq_map: dict, see develop_plan()
     :return: list
     '''
     assert isinstance(course_list, list)
@@ -531,10 +578,14 @@ def iterate_plan(course_list, max_num, start_qtr, num_iterations):
     assert isinstance(start_qtr, int)
     assert max_num > 0 and start_qtr > 0 and num_iterations > 0
 
-    return min([develop_plan(course_list, max_num, start_qtr) for i in range(num_iterations)], key=len)
+    # load the data once for all iterations
+    if prereq_map is None:
+        prereq_map = get_prereq_map(set(re.search('[a-zA-Z]+', course).group() for course in course_list))
 
+    return min([develop_plan(course_list, max_num, start_qtr, quarters, start_term, offerings, prereq_map) for i in range(num_iterations)], key=len)
 
-def iterate_plan_recursions(course_list, max_num, start_qtr, num_iterations):
+
+def iterate_plan_recursions(course_list, max_num, start_qtr, num_iterations, quarters=None, start_term=None):
     '''
     Takes the minimum length planner of num_interations executions of develop_plan using a
     recursively generated prereqs
@@ -543,6 +594,8 @@ def iterate_plan_recursions(course_list, max_num, start_qtr, num_iterations):
     :param max_num: int
     :param start_qtr: int
     :param num_iterations: int
+    :param quarters: list of quarter codes, see develop_plan()
+    :param start_term: str
     :return: list
     '''
     assert isinstance(course_list, list)
@@ -551,7 +604,7 @@ def iterate_plan_recursions(course_list, max_num, start_qtr, num_iterations):
     assert isinstance(num_iterations, int)
     assert max_num > 0 and start_qtr > 0 and num_iterations > 0
 
-    return min([develop_plan_recursion(course_list, max_num, start_qtr) for i in range(num_iterations)], key=len)
+    return min([develop_plan_recursion(course_list, max_num, start_qtr, quarters, start_term) for i in range(num_iterations)], key=len)
 
 
 '''
@@ -586,3 +639,6 @@ beng_preset = ['BENG 1', 'BILD 1', 'CHEM 6A', 'CHEM 6B', 'MAE 8', 'MATH 20A', 'M
                'BENG 140B', 'BENG 172', 'BENG 186B', 'BENG 187A', 'BENG 191', 'MAE 170', 'BENG 122A', 'BENG 125', \
                'BENG 130', 'BENG 186A', 'BENG 187B', 'BENG 187C', 'BENG 187D', 'BENG 169A', 'BENG 169B', 'BENG 191', \
                'MAE 107', 'MAE 150', 'ECE 171', 'ECE 174']
+
+# presets by department, see above
+presets = {'ECE': ece_preset, 'CSE': cse_preset, 'NANO': nano_preset, 'SE': se_preset, 'MAE': mae_preset, 'BENG': beng_preset}
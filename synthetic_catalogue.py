@@ -0,0 +1,213 @@
+'''
+Generates synthetic catalogues in the raw_course_data/ and quarter_data/ formats, for testing the pipeline at scale.
+
+Usage: python synthetic_catalogue.py OUT_DIR [--scale 10] [--depts 12] [--or-density 0.3] ...
+'''
+import argparse
+import os
+import random
+
+from offerings import REGULAR_SEASONS, term_range
+
+# undergrad courses in a typical real department, i.e. scale 1
+BASE_COURSES = 150
+
+# quarters recorded by default, covering the default visualization and planning windows
+DEFAULT_TERMS = term_range('FA17', 'SP20')
+
+# prereq html, in the format of the catalogue pages (see scrapercleaner.clean_scrape())
+GROUP_TMPL = ' border-width:1px; border-color: #C0C0C0; padding:5px 5px 5px 5px;"> {} '
+COURSE_TMPL = '<span class="bold_text">{}{}    </span> (Synthetic Course {})  <br/>'
+OR_SEP = ' <center><span class="ertext">or</span></center> '
+
+def get_dept_names(num_depts):
+    '''
+    Returns num_depts department codes (SYNA, SYNB, ..., SYNAA, ...), which can't clash with real departments.
+
+    :param num_depts: int
+    :return: list
+    '''
+    assert isinstance(num_depts, int) and num_depts > 0, 'num_depts error: must be a positive int'
+    return ['SYN' + get_suffix(i) for i in range(num_depts)]
+
+def get_suffix(i):
+    '''
+    Returns the i-th letter suffix: A, B, ..., Z, AA, AB, ...
+
+    :param i: int
+    :return: str
+    '''
+    suffix = ''
+    i += 1
+    while i > 0:
+        i, r = divmod(i - 1, 26)
+        suffix = chr(ord('A') + r) + suffix
+    return suffix
+
+def get_course_levels(num_courses, depth):
+    '''
+    Splits num_courses course numbers (all undergrad, i.e. below 200) into depth levels of increasing numbers.
+    Once a level runs out of plain numbers, its courses are split into families (20A, 20B, ...).
+
+    :param num_courses: int
+    :param depth: int
+    :return: list of lists of str
+    '''
+    assert isinstance(num_courses, int) and num_courses > 0, 'num_courses error: must be a positive int'
+    assert isinstance(depth, int) and 0 < depth < 199, 'depth error: must be between 1 and 198'
+
+    levels = []
+    for level in range(depth):
+        lo = 1 + level * 199 // depth
+        hi = 1 + (level + 1) * 199 // depth
+        count = num_courses // depth + (1 if level < num_courses % depth else 0)
+        family = -(-count // (hi - lo))
+        if family == 1:
+            levels.append([str(lo + i) for i in range(count)])
+        else:
+            levels.append([str(lo + i // family) + get_suffix(i % family) for i in range(count)])
+
+    return levels
+
+def generate_prereqs(rng, dept, level, levels, other_levels, avg_prereqs, or_density, or_width, cross_dept):
+    '''
+    Picks the prereq groups of a course at the given level. Prereqs come from lower levels (mostly the one
+    just below, which also yields redundant prereqs), and from other departments with probability cross_dept.
+
+    :return: list of lists of (dept, num)
+    '''
+    if level == 0:
+        return []
+
+    groups = []
+    used = set()
+    for _ in range(rng.randint(0, round(2 * avg_prereqs))):
+        size = rng.randint(2, or_width) if or_width > 1 and rng.random() < or_density else 1
+        group = []
+        for _ in range(size):
+            pre_level = level - 1 if rng.random() < 0.6 else rng.randrange(level)
+            pre_dept = dept
+            if other_levels and rng.random() < cross_dept:
+                pre_dept = rng.choice(sorted(other_levels))
+                pre_level = min(pre_level, len(other_levels[pre_dept]) - 1)
+            candidates = other_levels[pre_dept][pre_level] if pre_dept != dept else levels[pre_level]
+            course = (pre_dept, rng.choice(candidates))
+            if course not in used:
+                used.add(course)
+                group.append(course)
+        if group:
+            groups.append(group)
+
+    return groups
+
+def format_prereqs(groups):
+    '''
+    Formats prereq groups as catalogue html, so that clean_scrape() parses them back into the same groups.
+
+    :param groups: list of lists of (dept, num)
+    :return: str or None
+    '''
+    if not groups:
+        return None
+    return 'and'.join(GROUP_TMPL.format(OR_SEP.join(COURSE_TMPL.format(d, n, n) for d, n in group)) for group in groups)
+
+def generate_catalogue(out_dir, num_depts=1, scale=1, depth=6, avg_prereqs=1.5, or_density=0.3, or_width=3,
+                       cross_dept=0.1, terms=None, seed=0):
+    '''
+    Writes a synthetic catalogue to out_dir/raw_course_data/DEPT.txt and out_dir/quarter_data/DEPT_TERM.txt,
+    and returns the department codes. Each department has BASE_COURSES * scale courses.
+
+    :param out_dir: directory to run the pipeline from
+    :type out_dir: str
+    :param num_depts: number of departments
+    :type num_depts: int
+    :param scale: number of courses per department, relative to a real department
+    :type scale: int or float
+    :param depth: number of levels of the prereq chains
+    :type depth: int
+    :param avg_prereqs: average number of prereq groups per course (above the first level)
+    :type avg_prereqs: float
+    :param or_density: probability that a prereq group has interchangeable courses
+    :type or_density: float
+    :param or_width: max number of interchangeable courses in a group
+    :type or_width: int
+    :param cross_dept: probability that a prereq is from another department
+    :type cross_dept: float
+    :param terms: quarters to record offerings for, defaults to DEFAULT_TERMS
+    :type terms: list
+    :param seed: random seed, the same arguments and seed always give the same catalogue
+    :type seed: int
+    :return: list
+    '''
+    assert isinstance(out_dir, str)
+    assert scale > 0, 'scale error: must be positive'
+    assert 0 <= or_density <= 1 and 0 <= cross_dept <= 1, 'probability error: must be between 0 and 1'
+
+    rng = random.Random(seed)
+    terms = terms or DEFAULT_TERMS
+    num_courses = max(depth, int(BASE_COURSES * scale))
+    depts = get_dept_names(num_depts)
+    dept_levels = {dept: get_course_levels(num_courses, depth) for dept in depts}
+
+    for directory in ('raw_course_data', 'quarter_data'):
+        if not os.path.isdir(os.path.join(out_dir, directory)):
+            os.makedirs(os.path.join(out_dir, directory))
+
+    for dept in depts:
+        levels = dept_levels[dept]
+        other_levels = {d: l for d, l in dept_levels.items() if d != dept}
+        raw_courses = dict()
+        offered = {term: [] for term in terms}
+        for level, nums in enumerate(levels):
+            for num in nums:
+                groups = generate_prereqs(rng, dept, level, levels, other_levels, avg_prereqs, or_density, or_width, cross_dept)
+                key = '{} {}. Synthetic Course {} ({})'.format(dept, num, num, rng.choice((2, 4)))
+                raw_courses[key] = ('Synthetic course at level {} of {}. '.format(level + 1, depth), format_prereqs(groups))
+
+                # offered in 1 to 3 seasons, in most years
+                seasons = rng.sample(REGULAR_SEASONS, rng.choice((1, 1, 2, 3)))
+                for term in terms:
+                    if term[:2] in seasons and rng.random() < 0.85:
+                        offered[term].append(num)
+
+        with open(os.path.join(out_dir, 'raw_course_data', dept + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(repr(raw_courses))
+        for term, nums in offered.items():
+            with open(os.path.join(out_dir, 'quarter_data', '{}_{}.txt'.format(dept, term)), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(nums))
+
+    return depts
+
+def add_generator_args(parser):
+    '''
+    Adds the catalogue shape options of generate_catalogue() to an argparse parser.
+
+    :param parser: argparse.ArgumentParser
+    :return: None
+    '''
+    parser.add_argument('--depts', type=int, default=1, help='number of departments (default: 1)')
+    parser.add_argument('--depth', type=int, default=6, help='number of levels of prereq chains (default: 6)')
+    parser.add_argument('--avg-prereqs', type=float, default=1.5, help='average prereq groups per course (default: 1.5)')
+    parser.add_argument('--or-density', type=float, default=0.3, help='probability a prereq group is an OR group (default: 0.3)')
+    parser.add_argument('--or-width', type=int, default=3, help='max courses in an OR group (default: 3)')
+    parser.add_argument('--cross-dept', type=float, default=0.1, help='probability a prereq is from another department (default: 0.1)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+
+def get_generator_args(args):
+    '''
+    Returns the generate_catalogue() keyword arguments from parsed add_generator_args() options.
+
+    :param args: argparse.Namespace
+    :return: dict
+    '''
+    return dict(num_depts=args.depts, depth=args.depth, avg_prereqs=args.avg_prereqs, or_density=args.or_density,
+                or_width=args.or_width, cross_dept=args.cross_dept, seed=args.seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic catalogue in the raw_course_data/quarter_data format.')
+    parser.add_argument('out_dir', help='directory to write raw_course_data/ and quarter_data/ to')
+    parser.add_argument('--scale', type=float, default=1, help='courses per department, relative to a real department (default: 1)')
+    add_generator_args(parser)
+    args = parser.parse_args()
+    depts = generate_catalogue(args.out_dir, scale=args.scale, **get_generator_args(args))
+    print('wrote {} departments to {}'.format(len(depts), args.out_dir))
@@ -0,0 +1,229 @@
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+
+from analytics import get_node_metrics
+from course_graph import get_dept_info, get_ancestor_index
+from strip_catalogue import get_offerings, get_prereq_map, iterate_plan, PLAN_QUARTERS
+
+# supported perturbations, e.g. {'op': 'remove_offering', 'course': 'ECE 35', 'season': 'WI'}
+OPS = ('remove_offering', 'add_offering', 'remove_course', 'remove_prereq', 'add_prereq')
+
+class WhatIfBase:
+    """
+    Shared state for what-if scenarios: the offerings index, prereq map, department graphs and
+    metrics, and the plan length without any perturbation. Built once, and reused by every scenario.
+    """
+    def __init__(self, course_list, depts=None, max_num=5, start_qtr=1, num_iterations=20, quarters=None, start_term=None, seed=0):
+        assert isinstance(course_list, list)
+
+        self.course_list = course_list
+        self.plan_args = dict(max_num=max_num, start_qtr=start_qtr, num_iterations=num_iterations,
+                              quarters=quarters or PLAN_QUARTERS, start_term=start_term)
+        self.seed = seed
+
+        major_list = set(re.search('[a-zA-Z]+', course).group() for course in course_list)
+        self.offerings = get_offerings(major_list, self.plan_args['quarters'])
+        self.offerings.projection()
+        self.prereq_map = get_prereq_map(major_list)
+
+        self.graphs = dict()
+        self.metrics = dict()
+        for dept in depts or sorted(major_list):
+            info = get_dept_info(dept, layout=False)
+            self.graphs[dept] = (info.G, info.ancestors)
+            self.metrics[dept] = get_node_metrics(info.G, info.ancestors)
+
+        self.plan_length, self.unscheduled = self.get_plan_length(course_list, self.offerings, self.prereq_map)
+
+    def get_plan_length(self, course_list, offerings, prereq_map):
+        """
+        Returns the length of the best plan, seeded so that scenarios are compared on the same random choices,
+        and the courses of course_list the plan couldn't schedule.
+        :param course_list: list
+        :param offerings: offerings.OfferingsIndex
+        :param prereq_map: dict
+        :return: (int, set)
+        """
+        random.seed(self.seed)
+        plan = iterate_plan(course_list, offerings=offerings, prereq_map=prereq_map, **self.plan_args)
+        return len(plan), set(course_list) - set(course for quarter in plan for course in quarter)
+
+def get_terms(offerings, p):
+    """
+    Returns the recorded terms a perturbation applies to: its 'term', or every term of its 'season'.
+    Raises ValueError if it has neither, or if they aren't recorded for the course's department.
+    :param offerings: offerings.OfferingsIndex
+    :param p: perturbation
+    :type p: dict
+    :return: list
+    """
+    dept = p['course'].split()[0]
+    if 'term' in p:
+        if not offerings.has(dept, p['term']):
+            raise ValueError('term error: {} is not recorded for {}'.format(p['term'], dept))
+        return [p['term']]
+    if 'season' not in p:
+        raise ValueError('{} error: needs a term or a season'.format(p['op']))
+    terms = [t for t in offerings.terms if t[:2] == p['season'] and offerings.has(dept, t)]
+    if not terms:
+        raise ValueError('season error: no {} terms are recorded for {}'.format(p['season'], dept))
+    return terms
+
+def evaluate_scenario(base, scenario):
+    """
+    Applies the perturbations of a scenario on top of the shared base, and returns the plan length and
+    the course metrics that changed. Only the perturbed courses and the courses downstream of them are recomputed.
+    A scenario is infeasible if the plan can no longer schedule some courses the base plan did (e.g. every offering
+    of a required course was removed); those courses are listed in 'unschedulable', and plan_delta is None,
+    since the shorter plan isn't comparable. A removed or unschedulable course can't satisfy any prereq, so the
+    courses that have a prereq group made up only of such courses are unschedulable too.
+    :param base: shared state
+    :type base: WhatIfBase
+    :param scenario: {'name': str, 'perturbations': list of dict}
+    :type scenario: dict
+    :return: dict
+    """
+    assert isinstance(scenario, dict) and isinstance(scenario.get('perturbations'), list)
+
+    offerings = base.offerings
+    prereq_map = base.prereq_map
+    course_list = base.course_list
+    graphs = dict()   # dept -> (G, ancestors, touched nodes), copied on first change
+
+    def get_graph(dept):
+        if dept not in graphs:
+            G, ancestors = base.graphs[dept]
+            graphs[dept] = (G.copy(), dict(ancestors), set())
+        return graphs[dept]
+
+    removed = set()   # courses removed by remove_course
+    for p in scenario['perturbations']:
+        if p.get('op') not in OPS:
+            raise ValueError('op error: must be one of ' + ', '.join(OPS))
+        if 'course' not in p or (p['op'] in ('remove_prereq', 'add_prereq') and 'prereq' not in p):
+            raise ValueError('{} error: needs a course{}'.format(p['op'], ' and a prereq' if p['op'].endswith('prereq') else ''))
+        dept, num = p['course'].split()
+
+        if p['op'] in ('remove_offering', 'add_offering', 'remove_course'):
+            if offerings is base.offerings:
+                offerings = offerings.copy()
+            terms = get_terms(offerings, p) if p['op'] != 'remove_course' else offerings.terms
+            offerings.set_offered(p['course'], [t for t in terms if offerings.has(dept, t)], p['op'] == 'add_offering')
+
+        if p['op'] == 'remove_course':
+            course_list = [c for c in course_list if c != p['course']]
+            removed.add(p['course'])
+            if dept in base.graphs:
+                G, ancestors, touched = get_graph(dept)
+                if num in G:
+                    touched.update(G.successors(num))
+                    touched.update(G.predecessors(num))
+                    G.remove_node(num)
+                    del ancestors[num]
+
+        elif p['op'] in ('remove_prereq', 'add_prereq'):
+            if prereq_map is base.prereq_map:
+                prereq_map = dict(prereq_map)
+            groups = prereq_map.get(p['course'], [])
+            if p['op'] == 'add_prereq':
+                prereq_map[p['course']] = groups + [[p['prereq']]]
+            else:
+                groups = [[c for c in group if c != p['prereq']] for group in groups]
+                prereq_map[p['course']] = [group for group in groups if group]
+
+            pre_dept, pre_num = p['prereq'].split()
+            if dept in base.graphs and pre_dept == dept:
+                G, ancestors, touched = get_graph(dept)
+                if p['op'] == 'add_prereq':
+                    G.add_edge(pre_num, num, weight=1)
+                elif G.has_edge(pre_num, num):
+                    G.remove_edge(pre_num, num)
+                touched.update((pre_num, num))
+
+    # recompute the metrics of the touched courses, their descendants, and their ancestors (whose descendants changed)
+    changed = []
+    for dept, (G, ancestors, touched) in graphs.items():
+        old_G, old_ancestors = base.graphs[dept]
+        stale = set(touched)
+        for n in touched:
+            for H in (old_G, G):
+                if n in H:
+                    stale.update(nx.algorithms.dag.descendants(H, n))
+        get_ancestor_index(G, stale, ancestors)
+
+        affected = set(stale)
+        for n in stale:
+            affected.update(old_ancestors.get(n, ()))
+            affected.update(ancestors.get(n, ()))
+
+        old_metrics = base.metrics[dept]
+        for n in sorted(affected | (set(old_G) - set(G))):
+            if n not in G:
+                metrics = dict.fromkeys(old_metrics[n], None)
+            else:
+                metrics = dict(in_degree=G.in_degree(n), out_degree=G.out_degree(n), num_ancestors=len(ancestors[n]),
+                               num_descendants=len(nx.algorithms.dag.descendants(G, n)))
+            for metric, value in metrics.items():
+                base_value = old_metrics.get(n, {}).get(metric)
+                if value != base_value:
+                    changed.append(dict(course=dept + ' ' + n, metric=metric, base=base_value, value=value))
+
+    # the planner treats prereqs outside the course list as already taken, so the courses blocked by removed (or
+    # newly unschedulable) courses are dropped, and the plan is redone until no more courses become unschedulable
+    unavailable = set(removed)
+    while True:
+        blocked = set()
+        while True:
+            newly_blocked = set(c for c in course_list if c not in blocked and any(
+                group and all(g in unavailable or g in blocked for g in group) for group in prereq_map.get(c, [])))
+            if not newly_blocked:
+                break
+            blocked.update(newly_blocked)
+
+        plan_length, unscheduled = base.get_plan_length([c for c in course_list if c not in blocked], offerings, prereq_map)
+        newly_unscheduled = unscheduled - base.unscheduled - unavailable
+        if not newly_unscheduled:
+            break
+        unavailable.update(newly_unscheduled)
+
+    unschedulable = sorted((unavailable - removed) | blocked)
+    return dict(name=scenario.get('name', ''), plan_length=plan_length,
+                plan_delta=None if unschedulable else plan_length - base.plan_length,
+                infeasible=bool(unschedulable), unschedulable=unschedulable, changed_metrics=changed)
+
+_base = None
+
+def _init_worker(base):
+    global _base
+    _base = base
+
+def _evaluate(scenario):
+    return evaluate_scenario(_base, scenario)
+
+def run_whatif(scenarios, course_list, depts=None, workers=None, **base_args):
+    """
+    Evaluates what-if scenarios (see evaluate_scenario()) against a course list, in parallel.
+    The shared base is built once and sent to each worker process when it starts.
+    Example scenario: {'name': 'no ECE 35 in winter', 'perturbations': [{'op': 'remove_offering', 'course': 'ECE 35', 'season': 'WI'}]}
+    :param scenarios: scenarios to evaluate
+    :type scenarios: list
+    :param course_list: courses to plan, e.g. strip_catalogue.ece_preset
+    :type course_list: list
+    :param depts: departments to compute graph metrics for, defaults to the departments in course_list
+    :type depts: list or None
+    :param workers: number of worker processes (1 evaluates in this process), defaults to one per core
+    :type workers: int or None
+    :param base_args: extra arguments for WhatIfBase
+    :return: list
+    """
+    assert isinstance(scenarios, list)
+
+    base = WhatIfBase(course_list, depts, **base_args)
+    if workers == 1 or len(scenarios) <= 1:
+        return [evaluate_scenario(base, scenario) for scenario in scenarios]
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(base,)) as executor:
+        return list(executor.map(_evaluate, scenarios))